@@ -0,0 +1,252 @@
+# analytics.py
+"""
+Agrégats analytics maintenus de façon incrémentale
+Chaque commande créée met à jour les compteurs globaux et les buckets
+temporels, de sorte que GET /analytics ne dépend pas de la taille de
+l'historique des commandes. Une commande annulée est retirée des agrégats
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from lifecycle import counts_in_analytics
+
+
+class AnalyticsAggregates:
+    """Chiffre d'affaires, nombre de commandes et classement top-k des produits"""
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+        self.total_revenue = 0.0
+        self.total_orders = 0
+        self.product_quantities: Dict[str, int] = {}
+        # Noms des k produits les plus vendus, triés par quantité décroissante
+        self._top: List[str] = []
+        self._lock = Lock()
+
+    @classmethod
+    def from_orders(cls, orders: Iterable, top_k: int = 5) -> "AnalyticsAggregates":
+        """Reconstruction complète à partir de l'historique (contrôle de cohérence)"""
+        aggregates = cls(top_k)
+        for order in orders:
+            if counts_in_analytics(order):
+                aggregates.record_order(order)
+        return aggregates
+
+    def record_order(self, order) -> None:
+        with self._lock:
+            self.total_revenue += order.total_amount
+            self.total_orders += 1
+            for item in order.items:
+                self.product_quantities[item.product_name] = (
+                    self.product_quantities.get(item.product_name, 0) + item.quantity
+                )
+                self._promote(item.product_name)
+
+    def remove_order(self, order) -> None:
+        """Retirer une commande annulée ; le classement est recalculé (quantités en baisse)"""
+        with self._lock:
+            self.total_revenue -= order.total_amount
+            self.total_orders -= 1
+            _subtract_items(self.product_quantities, order.items)
+            self._top = [name for name, _ in heapq.nlargest(
+                self.top_k, self.product_quantities.items(), key=lambda item: item[1])]
+
+    def _promote(self, name: str) -> None:
+        quantities = self.product_quantities
+        if name not in self._top:
+            if len(self._top) >= self.top_k and quantities[name] <= quantities[self._top[-1]]:
+                return
+            self._top.append(name)
+        # Tri stable : à quantité égale, le produit classé en premier garde sa place
+        self._top.sort(key=quantities.__getitem__, reverse=True)
+        del self._top[self.top_k:]
+
+    @property
+    def average_order_value(self) -> float:
+        return self.total_revenue / self.total_orders if self.total_orders > 0 else 0
+
+    def top_products(self) -> List[dict]:
+        return [
+            {"name": name, "quantity_sold": self.product_quantities[name]}
+            for name in self._top
+        ]
+
+    def matches(self, other: "AnalyticsAggregates") -> bool:
+        return (
+            self.total_orders == other.total_orders
+            and round(self.total_revenue, 2) == round(other.total_revenue, 2)
+            and self.product_quantities == other.product_quantities
+        )
+
+
+def _subtract_items(quantities: Dict[str, int], items) -> None:
+    # Les produits retombés à zéro disparaissent, comme dans une reconstruction complète
+    for item in items:
+        remaining = quantities.get(item.product_name, 0) - item.quantity
+        if remaining > 0:
+            quantities[item.product_name] = remaining
+        else:
+            quantities.pop(item.product_name, None)
+
+
+PERIOD_ALIASES = {"daily": "today", "weekly": "week", "monthly": "month", "yearly": "year"}
+
+
+def resolve_period(period: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                   now: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Bornes [début, fin) d'une période d'analyse
+    start_date/end_date (inclus) priment sur la période ; (None, None) signifie tout l'historique
+    """
+    now = now or datetime.now()
+    if start_date or end_date:
+        start = datetime.combine(start_date, time.min) if start_date else None
+        end = datetime.combine(end_date + timedelta(days=1), time.min) if end_date else now
+        return start, end
+
+    period = PERIOD_ALIASES.get(period, period)
+    midnight = datetime.combine(now.date(), time.min)
+    if period == "today":
+        return midnight, now
+    if period == "week":
+        return midnight - timedelta(days=now.weekday()), now
+    if period == "month":
+        return midnight.replace(day=1), now
+    if period == "year":
+        return midnight.replace(month=1, day=1), now
+    return None, None
+
+
+class _Bucket:
+    __slots__ = ("revenue", "orders", "products")
+
+    def __init__(self):
+        self.revenue = 0.0
+        self.orders = 0
+        self.products: Dict[str, int] = {}
+
+
+class PeriodSummary:
+    """Résultat agrégé d'une plage de buckets"""
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+        self.total_revenue = 0.0
+        self.total_orders = 0
+        self.product_quantities: Dict[str, int] = {}
+
+    def add(self, bucket: _Bucket) -> None:
+        self.total_revenue += bucket.revenue
+        self.total_orders += bucket.orders
+        for name, quantity in bucket.products.items():
+            self.product_quantities[name] = self.product_quantities.get(name, 0) + quantity
+
+    @property
+    def average_order_value(self) -> float:
+        return self.total_revenue / self.total_orders if self.total_orders > 0 else 0
+
+    def top_products(self) -> List[dict]:
+        top = heapq.nlargest(self.top_k, self.product_quantities.items(), key=lambda item: item[1])
+        return [{"name": name, "quantity_sold": quantity} for name, quantity in top]
+
+
+class TimeBucketedAnalytics:
+    """
+    Agrégats par heure et par jour, indexés sur Order.created_at
+    Une période se calcule en sommant au plus 48 buckets horaires (jours partiels
+    aux extrémités) et un bucket par jour complet
+    """
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+        # Clés : ordinal du jour * 24 + heure pour les heures, ordinal du jour pour les jours
+        self._hours: Dict[int, _Bucket] = {}
+        self._days: Dict[int, _Bucket] = {}
+        self._first_day: Optional[int] = None
+        self._last_day: Optional[int] = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_orders(cls, orders: Iterable, top_k: int = 5) -> "TimeBucketedAnalytics":
+        """Reconstruction des buckets à partir de l'historique (backend persistant)"""
+        buckets = cls(top_k)
+        for order in orders:
+            if counts_in_analytics(order):
+                buckets.record_order(order)
+        return buckets
+
+    def record_order(self, order) -> None:
+        created_at = order.created_at or datetime.now()
+        day = created_at.toordinal()
+        with self._lock:
+            if self._first_day is None or day < self._first_day:
+                self._first_day = day
+            if self._last_day is None or day > self._last_day:
+                self._last_day = day
+            for bucket in (self._bucket(self._hours, day * 24 + created_at.hour),
+                           self._bucket(self._days, day)):
+                bucket.revenue += order.total_amount
+                bucket.orders += 1
+                for item in order.items:
+                    bucket.products[item.product_name] = bucket.products.get(item.product_name, 0) + item.quantity
+
+    def remove_order(self, order) -> None:
+        """Retirer une commande annulée de ses buckets horaire et journalier"""
+        created_at = order.created_at or datetime.now()
+        day = created_at.toordinal()
+        with self._lock:
+            for buckets, key in ((self._hours, day * 24 + created_at.hour), (self._days, day)):
+                bucket = buckets.get(key)
+                if bucket is None:
+                    continue
+                bucket.revenue -= order.total_amount
+                bucket.orders -= 1
+                _subtract_items(bucket.products, order.items)
+
+    @staticmethod
+    def _bucket(buckets: Dict[int, _Bucket], key: int) -> _Bucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket()
+        return bucket
+
+    def summarize(self, start: Optional[datetime], end: Optional[datetime]) -> PeriodSummary:
+        """Somme des buckets couvrant [start, end), à la granularité de l'heure"""
+        summary = PeriodSummary(self.top_k)
+        with self._lock:
+            if self._first_day is None:
+                return summary
+            first_day, last_day = self._first_day, self._last_day
+            first_hour = start.toordinal() * 24 + start.hour if start else first_day * 24
+            # end est exclusif : la dernière heure incluse est celle qui précède end
+            last_moment = end - timedelta(microseconds=1) if end else None
+            last_hour = last_moment.toordinal() * 24 + last_moment.hour if last_moment else last_day * 24 + 23
+            first_hour = max(first_hour, first_day * 24)
+            last_hour = min(last_hour, last_day * 24 + 23)
+            if first_hour > last_hour:
+                return summary
+
+            start_day, end_day = first_hour // 24, last_hour // 24
+            if start_day == end_day:
+                self._add_hours(summary, first_hour, last_hour)
+                return summary
+            # Jour de début partiel, jours complets, puis jour de fin partiel
+            if first_hour % 24:
+                self._add_hours(summary, first_hour, start_day * 24 + 23)
+                start_day += 1
+            if last_hour % 24 != 23:
+                self._add_hours(summary, end_day * 24, last_hour)
+                end_day -= 1
+            for day in range(start_day, end_day + 1):
+                bucket = self._days.get(day)
+                if bucket is not None:
+                    summary.add(bucket)
+        return summary
+
+    def _add_hours(self, summary: PeriodSummary, first_hour: int, last_hour: int) -> None:
+        for hour in range(first_hour, last_hour + 1):
+            bucket = self._hours.get(hour)
+            if bucket is not None:
+                summary.add(bucket)
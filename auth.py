@@ -0,0 +1,92 @@
+# auth.py
+"""
+Caches d'authentification JWT
+Chaque utilisateur Locust réutilise le même token pendant toute sa session :
+la signature HS256 n'est vérifiée qu'une fois par token, jusqu'à son expiration.
+Les paires access/refresh récemment émises sont réutilisées lors des rafales de connexion
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TokenCache:
+    """Cache LRU borné des tokens vérifiés, indexé par empreinte SHA-256"""
+
+    def __init__(self, max_entries: int = 10000,
+                 on_hit: Optional[Callable[[], None]] = None,
+                 on_miss: Optional[Callable[[], None]] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._lock = Lock()
+        self._on_hit = on_hit
+        self._on_miss = on_miss
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        """Utilisateur associé à un token valide, None s'il faut le vérifier"""
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                # Token expiré : on le retire pour que jwt.decode signale l'expiration
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            if self._on_miss:
+                self._on_miss()
+            return None
+        if self._on_hit:
+            self._on_hit()
+        return entry[0]
+
+    def set(self, token: str, username: str, expires_at: float) -> None:
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (username, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class IssuedTokenCache:
+    """
+    Paires de tokens récemment émises, par utilisateur
+    Lors d'une rafale de connexions (spawn Locust), les utilisateurs virtuels
+    partagent la même paire tant qu'elle a moins de reuse_seconds, ce qui évite
+    de signer deux nouveaux JWT à chaque appel de /token
+    """
+
+    def __init__(self, reuse_seconds: float = 5.0):
+        self.reuse_seconds = reuse_seconds
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        self._lock = Lock()
+
+    def get(self, username: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is None or time.monotonic() - entry[0] > self.reuse_seconds:
+            return None
+        return entry[1]
+
+    def set(self, username: str, tokens: dict) -> None:
+        with self._lock:
+            self._entries[username] = (time.monotonic(), tokens)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
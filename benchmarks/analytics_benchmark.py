@@ -0,0 +1,86 @@
+"""
+Benchmark analytics - parcours objet par objet vs réductions en colonnes
+Calcule revenus, nombre de commandes et top produits sur tout l'historique et
+sur une semaine, à partir des commandes du repository (orders -> items) puis
+du stockage en colonnes (NumPy si installé, sinon tableaux array)
+
+Usage : python benchmarks/analytics_benchmark.py [--items 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import AnalyticsAggregates  # noqa: E402
+from columnar import ColumnarOrderItems, np  # noqa: E402
+from models import Order, OrderItem  # noqa: E402
+from repositories import OrderRepository  # noqa: E402
+
+CATALOG = [("1", "Espresso", 2.50), ("2", "Cappuccino", 3.80), ("3", "Croissant", 1.90),
+           ("4", "Thé Earl Grey", 2.20), ("5", "Sandwich Jambon", 4.50)]
+
+
+def build_history(item_count: int):
+    """Commandes de 2 lignes réparties sur un an, dans l'ordre chronologique"""
+    repository = OrderRepository()
+    columns = {"numpy": ColumnarOrderItems(use_numpy=True), "array": ColumnarOrderItems(use_numpy=False)}
+    order_count = item_count // 2
+    origin = datetime(2024, 1, 1)
+    step = timedelta(days=365) / order_count
+    for index in range(order_count):
+        first, second = CATALOG[index % 5], CATALOG[(index + 2) % 5]
+        order = Order.model_construct(
+            id=str(index), client_id=f"client-{index % 1000}", client_name="Client", status="pending",
+            items=[OrderItem.model_construct(product_id=first[0], product_name=first[1], quantity=2,
+                                             unit_price=first[2], total_price=first[2] * 2),
+                   OrderItem.model_construct(product_id=second[0], product_name=second[1], quantity=1,
+                                             unit_price=second[2], total_price=second[2])],
+            total_amount=first[2] * 2 + second[2], notes=None,
+            created_at=origin + step * index, updated_at=None
+        )
+        repository.add(order)
+        for store in columns.values():
+            store.record_order(order)
+    return repository, columns
+
+
+def object_walk(repository: OrderRepository, start=None, end=None):
+    """Parcours des enregistrements stockés, comme une reconstruction complète"""
+    summary = AnalyticsAggregates()
+    for record in repository._items.values():
+        if (start is None or record.created_at >= start) and (end is None or record.created_at < end):
+            summary.record_order(record)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000000, help="Nombre de lignes de commande")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures par cas (minimum retenu)")
+    args = parser.parse_args()
+
+    repository, columns = build_history(args.items)
+    week = (datetime(2024, 6, 3), datetime(2024, 6, 10))
+    if np is None:
+        print("NumPy non installé : seule la variante array est mesurée")
+        del columns["numpy"]
+
+    print(f"{args.items} lignes de commande ({len(repository)} commandes)")
+    print(f"{'Plage':>10} | {'Parcours objets':>16} | " + " | ".join(f"{name:>16}" for name in columns))
+    print("-" * (34 + 19 * len(columns)))
+    for label, (start, end) in (("historique", (None, None)), ("semaine", week)):
+        expected = object_walk(repository, start, end)
+        timings = [min(timeit.repeat(lambda: object_walk(repository, start, end), number=1, repeat=args.repeat))]
+        for store in columns.values():
+            assert expected.matches(store.summarize(start, end))
+            timings.append(min(timeit.repeat(lambda: store.summarize(start, end), number=1, repeat=args.repeat)))
+        print(f"{label:>10} | {timings[0] * 1000:>13.1f} ms | " + " | ".join(
+            f"{timing * 1000:>7.1f} ms x{timings[0] / timing:<5.0f}" for timing in timings[1:]
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -97,7 +97,7 @@ export default function(data) {
     
     const getClientsSuccess = check(getClientsResponse, {
         'Get Clients: Status 200': (r) => r.status === 200,
-        'Get Clients: Liste présente': (r) => Array.isArray(JSON.parse(r.body)),
+        'Get Clients: Liste présente': (r) => Array.isArray(JSON.parse(r.body).items),
         'Get Clients: Temps < 300ms': (r) => r.timings.duration < 300
     });
     
@@ -0,0 +1,82 @@
+"""
+Benchmark mémoire - octets par commande stockée
+Compare le stockage de modèles Pydantic (Order + OrderItem) avec les
+enregistrements compacts à __slots__ de OrderRepository, pour 10k, 100k
+et 1M commandes reçues comme des requêtes POST /orders (JSON parsé)
+
+Usage : python benchmarks/memory_benchmark.py [--sizes 10000,100000,1000000]
+(tracemalloc ralentit la construction : compter plusieurs minutes pour 1M)
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Order  # noqa: E402
+from repositories import OrderRepository  # noqa: E402
+
+CATALOG = [("1", "Espresso", 2.50), ("2", "Cappuccino", 3.80), ("3", "Croissant", 1.90),
+           ("4", "Thé Earl Grey", 2.20), ("5", "Sandwich Jambon", 4.50)]
+CLIENTS = 1000
+
+
+def order_payloads(count: int):
+    """Corps JSON de commandes : chaque commande a ses propres chaînes, comme après parsing"""
+    now = datetime.now().isoformat()
+    for index in range(count):
+        first, second = CATALOG[index % 5], CATALOG[(index + 2) % 5]
+        total = round(first[2] * 2 + second[2], 2)
+        yield (
+            f'{{"id":"{uuid.uuid4()}","client_id":"client-{index % CLIENTS}",'
+            f'"client_name":"Client {index % CLIENTS}","items":['
+            f'{{"product_id":"{first[0]}","product_name":"{first[1]}","quantity":2,'
+            f'"unit_price":{first[2]},"total_price":{round(first[2] * 2, 2)}}},'
+            f'{{"product_id":"{second[0]}","product_name":"{second[1]}","quantity":1,'
+            f'"unit_price":{second[2]},"total_price":{second[2]}}}],'
+            f'"total_amount":{total},"created_at":"{now}","updated_at":"{now}"}}'
+        )
+
+
+def measure(count: int, store) -> float:
+    """Mémoire retenue (octets par commande) une fois les objets temporaires libérés"""
+    gc.collect()
+    tracemalloc.start()
+    container = store(Order.model_validate_json(payload) for payload in order_payloads(count))
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return retained / count
+
+
+def pydantic_list(orders):
+    return list(orders)
+
+
+def record_repository(orders):
+    repository = OrderRepository()
+    for order in orders:
+        repository.add(order)
+    return repository
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Nombres de commandes, séparés par des virgules")
+    args = parser.parse_args()
+
+    print(f"{'Commandes':>10} | {'Modèles Pydantic':>18} | {'Enregistrements':>18} | {'Gain':>6}")
+    print("-" * 63)
+    for count in (int(size) for size in args.sizes.split(",")):
+        models = measure(count, pydantic_list)
+        records = measure(count, record_repository)
+        print(f"{count:>10} | {models:>12.0f} o/cmd | {records:>12.0f} o/cmd | x{models / records:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
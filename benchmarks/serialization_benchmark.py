@@ -0,0 +1,76 @@
+"""
+Microbenchmark - coût de sérialisation des réponses de liste de commandes
+Compare le chemin FastAPI par défaut (revalidation response_model + jsonable_encoder
++ json.dumps), model_dump + orjson et le chemin rapide PrevalidatedJSONResponse
+pour des pages de 100, 1 000 et 10 000 commandes
+
+Usage : python benchmarks/serialization_benchmark.py [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Order, OrderItem, OrderPage  # noqa: E402
+from serialization import PrevalidatedJSONResponse  # noqa: E402
+
+SIZES = (100, 1000, 10000)
+
+
+def make_page(size: int) -> OrderPage:
+    now = datetime.now()
+    items = [
+        OrderItem(product_id="1", product_name="Espresso", quantity=2, unit_price=2.50, total_price=5.00),
+        OrderItem(product_id="3", product_name="Croissant", quantity=1, unit_price=1.90, total_price=1.90),
+    ]
+    orders = [
+        Order(id=str(index), client_id="client-1", client_name="Jean Dupont", items=items,
+              total_amount=6.90, created_at=now, updated_at=now)
+        for index in range(size)
+    ]
+    return OrderPage(items=orders, next_cursor=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre de mesures par cas (minimum retenu)")
+    args = parser.parse_args()
+
+    field = create_response_field(name="Response_get_orders", type_=OrderPage)
+
+    def default_path(page):
+        content = asyncio.run(serialize_response(field=field, response_content=page, is_coroutine=True))
+        return JSONResponse(content).body
+
+    def orjson_path(page):
+        return orjson.dumps(page.model_dump())
+
+    def fast_path(page):
+        return PrevalidatedJSONResponse(page, OrderPage).body
+
+    paths = [("FastAPI par défaut", default_path), ("model_dump + orjson", orjson_path),
+             ("PrevalidatedJSONResponse", fast_path)]
+
+    print(f"{'Commandes':>10} | " + " | ".join(f"{name:>26}" for name, _ in paths))
+    print("-" * (13 + 29 * len(paths)))
+    for size in SIZES:
+        page = make_page(size)
+        assert orjson.loads(fast_path(page)) == orjson.loads(default_path(page))
+        timings = [min(timeit.repeat(lambda: path(page), number=1, repeat=args.repeat)) for _, path in paths]
+        baseline = timings[0]
+        print(f"{size:>10} | " + " | ".join(
+            f"{timing * 1000:>14.2f} ms (x{baseline / timing:4.1f})" for timing in timings
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# cache.py
+"""
+Cache de réponses en mémoire pour les endpoints en lecture
+Entrées indexées par endpoint + paramètres, avec expiration (TTL),
+éviction LRU et invalidation explicite par endpoint lors des écritures,
+ainsi que les helpers ETag pour les GET conditionnels
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """Cache TTL + LRU partagé entre les endpoints"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0,
+                 on_hit: Optional[Callable[[str], None]] = None,
+                 on_miss: Optional[Callable[[str], None]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = Lock()
+        self._on_hit = on_hit
+        self._on_miss = on_miss
+
+    def get(self, endpoint: str, params: Hashable = ()) -> Any:
+        key = (endpoint, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                value = _MISSING
+        if value is _MISSING:
+            if self._on_miss:
+                self._on_miss(endpoint)
+            return None
+        if self._on_hit:
+            self._on_hit(endpoint)
+        return value
+
+    def set(self, endpoint: str, params: Hashable, value: Any) -> None:
+        key = (endpoint, params)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *endpoints: str) -> None:
+        """Supprimer toutes les entrées des endpoints donnés"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in endpoints]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag faible construit à partir d'une version (compteur ou updated_at)"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Vérifier un en-tête If-None-Match (liste d'ETags ou *)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,205 @@
+# columnar.py
+"""
+Stockage en colonnes des commandes et de leurs lignes pour les analytics
+Chaque commande ajoute ses valeurs à des tableaux typés (array) : horodatage et
+montant par commande, code produit, quantité et prix unitaire par ligne.
+Revenus, top produits et ventilations par heure/jour sont des réductions sur
+ces colonnes, vectorisées avec NumPy s'il est installé (dépendance optionnelle).
+Les colonnes sont en ajout seul : une commande annulée est ajoutée à des colonnes
+d'annulations, soustraites des résultats à la lecture
+"""
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from analytics import PeriodSummary
+from lifecycle import counts_in_analytics
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - repli sur les tableaux array
+    np = None
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+
+class ColumnarOrderItems:
+    """Colonnes des commandes (ordre d'arrivée) et de leurs lignes"""
+
+    def __init__(self, top_k: int = 5, use_numpy: bool = True):
+        self.top_k = top_k
+        self.use_numpy = use_numpy and np is not None
+        # Dictionnaire des noms de produits : code entier <-> nom
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+        # Colonnes par commande
+        self.order_timestamps = array("d")
+        self.order_totals = array("d")
+        # Colonnes par ligne de commande
+        self.item_timestamps = array("d")
+        self.product_codes = array("l")
+        self.quantities = array("l")
+        self.unit_prices = array("d")
+        # Tant que les horodatages arrivent croissants, une plage se trouve par dichotomie
+        self._sorted = True
+        self._lock = Lock()
+        # Commandes annulées (même structure), créées à la première annulation
+        self._cancelled: Optional["ColumnarOrderItems"] = None
+
+    @classmethod
+    def from_orders(cls, orders: Iterable, top_k: int = 5) -> "ColumnarOrderItems":
+        columns = cls(top_k)
+        for order in orders:
+            if counts_in_analytics(order):
+                columns.record_order(order)
+        return columns
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def record_order(self, order) -> None:
+        timestamp = (order.created_at or datetime.now()).timestamp()
+        with self._lock:
+            if self.order_timestamps and timestamp < self.order_timestamps[-1]:
+                self._sorted = False
+            self.order_timestamps.append(timestamp)
+            self.order_totals.append(order.total_amount)
+            for item in order.items:
+                self.item_timestamps.append(timestamp)
+                self.product_codes.append(self._code(item.product_name))
+                self.quantities.append(item.quantity)
+                self.unit_prices.append(item.unit_price)
+
+    def remove_order(self, order) -> None:
+        """Annuler une commande déjà enregistrée (ajoutée aux colonnes d'annulations)"""
+        with self._lock:
+            if self._cancelled is None:
+                self._cancelled = ColumnarOrderItems(self.top_k, self.use_numpy)
+        self._cancelled.record_order(order)
+
+    def __len__(self) -> int:
+        return len(self.product_codes)
+
+    @staticmethod
+    def _bounds(start: Optional[datetime], end: Optional[datetime]) -> Tuple[float, float]:
+        return (start.timestamp() if start else float("-inf"), end.timestamp() if end else float("inf"))
+
+    def _range(self, timestamps: array, low: float, high: float) -> Tuple[int, int]:
+        return bisect_left(timestamps, low), bisect_left(timestamps, high)
+
+    def summarize(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> PeriodSummary:
+        """Revenus, nombre de commandes et quantités par produit sur [start, end)"""
+        low, high = self._bounds(start, end)
+        summary = PeriodSummary(self.top_k)
+        with self._lock:
+            if self.use_numpy:
+                self._summarize_numpy(summary, low, high)
+            else:
+                self._summarize_arrays(summary, low, high)
+        if self._cancelled is not None:
+            cancelled = self._cancelled.summarize(start, end)
+            summary.total_orders -= cancelled.total_orders
+            summary.total_revenue -= cancelled.total_revenue
+            for name, quantity in cancelled.product_quantities.items():
+                remaining = summary.product_quantities[name] - quantity
+                if remaining > 0:
+                    summary.product_quantities[name] = remaining
+                else:
+                    del summary.product_quantities[name]
+        return summary
+
+    def _summarize_numpy(self, summary: PeriodSummary, low: float, high: float) -> None:
+        # Vues sans copie sur les colonnes, libérées avant toute nouvelle insertion (verrou)
+        order_ts = np.frombuffer(self.order_timestamps, dtype=np.float64)
+        totals = np.frombuffer(self.order_totals, dtype=np.float64)
+        item_ts = np.frombuffer(self.item_timestamps, dtype=np.float64)
+        codes = np.frombuffer(self.product_codes, dtype=np.dtype(self.product_codes.typecode))
+        quantities = np.frombuffer(self.quantities, dtype=np.dtype(self.quantities.typecode))
+        if self._sorted:
+            orders = slice(*np.searchsorted(order_ts, (low, high)))
+            items = slice(*np.searchsorted(item_ts, (low, high)))
+        else:
+            orders = (order_ts >= low) & (order_ts < high)
+            items = (item_ts >= low) & (item_ts < high)
+        selected = totals[orders]
+        summary.total_orders = int(selected.size)
+        summary.total_revenue = float(selected.sum())
+        sold = np.bincount(codes[items], weights=quantities[items], minlength=len(self._names))
+        summary.product_quantities = {
+            self._names[code]: int(sold[code]) for code in np.flatnonzero(sold)
+        }
+
+    def _summarize_arrays(self, summary: PeriodSummary, low: float, high: float) -> None:
+        if self._sorted:
+            first, last = self._range(self.order_timestamps, low, high)
+            summary.total_orders = last - first
+            summary.total_revenue = sum(self.order_totals[first:last])
+            first, last = self._range(self.item_timestamps, low, high)
+            pairs = zip(self.product_codes[first:last], self.quantities[first:last])
+        else:
+            selected = [total for ts, total in zip(self.order_timestamps, self.order_totals) if low <= ts < high]
+            summary.total_orders = len(selected)
+            summary.total_revenue = sum(selected)
+            pairs = ((code, quantity) for ts, code, quantity
+                     in zip(self.item_timestamps, self.product_codes, self.quantities) if low <= ts < high)
+        sold = [0] * len(self._names)
+        for code, quantity in pairs:
+            sold[code] += quantity
+        summary.product_quantities = {self._names[code]: quantity for code, quantity in enumerate(sold) if quantity}
+
+    def breakdown(self, start: Optional[datetime], end: Optional[datetime],
+                  granularity: str = "day") -> List[dict]:
+        """
+        Commandes et revenus par heure ou par jour sur [start, end), buckets non vides
+        Les buckets partent de start (ou de minuit du premier jour) par pas fixes
+        """
+        width = GRANULARITIES[granularity]
+        with self._lock:
+            if not self.order_timestamps:
+                return []
+            origin = start or datetime.fromtimestamp(min(self.order_timestamps)).replace(
+                hour=0, minute=0, second=0, microsecond=0)
+            low, high = origin.timestamp(), end.timestamp() if end else float("inf")
+            if self.use_numpy:
+                counts, revenues = self._breakdown_numpy(low, high, width)
+            else:
+                counts, revenues = self._breakdown_arrays(low, high, width)
+        buckets = [
+            {"period_start": origin + timedelta(seconds=index * width),
+             "total_orders": int(count), "total_revenue": round(float(revenues[index]), 2)}
+            for index, count in enumerate(counts) if count
+        ]
+        if self._cancelled is None:
+            return buckets
+        # Même origine et même pas : les buckets d'annulations s'alignent sur period_start
+        cancelled = {bucket["period_start"]: bucket for bucket in self._cancelled.breakdown(origin, end, granularity)}
+        for bucket in buckets:
+            removed = cancelled.get(bucket["period_start"])
+            if removed:
+                bucket["total_orders"] -= removed["total_orders"]
+                bucket["total_revenue"] = round(bucket["total_revenue"] - removed["total_revenue"], 2)
+        return [bucket for bucket in buckets if bucket["total_orders"]]
+
+    def _breakdown_numpy(self, low: float, high: float, width: int):
+        order_ts = np.frombuffer(self.order_timestamps, dtype=np.float64)
+        totals = np.frombuffer(self.order_totals, dtype=np.float64)
+        mask = (order_ts >= low) & (order_ts < high)
+        buckets = ((order_ts[mask] - low) // width).astype(np.int64)
+        return np.bincount(buckets), np.bincount(buckets, weights=totals[mask])
+
+    def _breakdown_arrays(self, low: float, high: float, width: int):
+        counts: Dict[int, int] = {}
+        revenues: Dict[int, float] = {}
+        for ts, total in zip(self.order_timestamps, self.order_totals):
+            if low <= ts < high:
+                bucket = int((ts - low) // width)
+                counts[bucket] = counts.get(bucket, 0) + 1
+                revenues[bucket] = revenues.get(bucket, 0.0) + total
+        size = max(counts) + 1 if counts else 0
+        return [counts.get(index, 0) for index in range(size)], [revenues.get(index, 0.0) for index in range(size)]
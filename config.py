@@ -0,0 +1,42 @@
+# config.py
+"""
+Configuration de l'API BuyYourKawa, lue depuis les variables d'environnement
+"""
+import os
+
+# Taille du threadpool AnyIO pour les chemins encore synchrones
+# (dépendances sync comme OAuth2PasswordRequestForm, backends de stockage bloquants)
+THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "40"))
+
+# Backend de stockage : "memory" (défaut, données perdues au redémarrage)
+# ou "sqlite" (fichier en mode WAL, partagé entre workers)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "buyyourkawa.db")
+
+# Journal des commandes (backend memory) : chemin du fichier JSON Lines rejoué au
+# démarrage ; vide = désactivé (le backend sqlite est déjà durable)
+ORDER_JOURNAL_PATH = os.getenv("ORDER_JOURNAL_PATH", "")
+
+# Nombre de processus workers uvicorn (python main.py) ; au-delà de 1, l'état doit
+# vivre dans un backend partagé (sqlite) et les métriques passent en mode multiprocess
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+# Sérialisation rapide : ORJSONResponse par défaut et réponses de liste encodées
+# sans revalidation par le response_model (voir serialization.py)
+FAST_JSON = os.getenv("API_FAST_JSON", "0") == "1"
+
+# Port dédié à l'exposition Prometheus (0 = uniquement /metrics sur le port de l'API)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Fichiers de scénarios dont les cibles SLA (*response_time*_ms) définissent les
+# buckets de l'histogramme de latence ; LATENCY_BUCKETS (secondes) les remplace
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SLA_FILES = [
+    os.path.join(_BASE_DIR, path)
+    for path in os.getenv(
+        "SLA_FILES", "charge_estimation/load_scenarios.json,charge_estimation/locust_config_realistic.json"
+    ).split(",") if path
+]
+LATENCY_BUCKETS = os.getenv("LATENCY_BUCKETS", "")
@@ -47,7 +47,7 @@ class BuyYourKawaUser(HttpUser):
                            headers=self.headers,
                            catch_response=True) as response:
             if response.status_code == 200:
-                clients = response.json()
+                clients = response.json().get("items", [])
                 if clients:
                     # Stocker quelques IDs et détails pour les tests suivants
                     for client in clients[:5]:
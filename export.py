@@ -0,0 +1,94 @@
+# export.py
+"""
+Exports en flux (NDJSON ou CSV) des clients et des commandes
+Les données sont lues page par page via le stockage et encodées au fil de
+l'eau : la mémoire reste constante quelle que soit la taille de l'export, et
+la boucle d'événements est rendue entre deux pages aux autres requêtes
+"""
+import csv
+import io
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+import anyio
+
+EXPORT_PAGE_SIZE = 500
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+CLIENT_COLUMNS = ["id", "name", "email", "phone", "street", "city", "zip", "country",
+                  "loyalty_points", "is_active", "created_at", "updated_at"]
+
+# Une ligne CSV par article de commande
+ORDER_COLUMNS = ["order_id", "client_id", "client_name", "status", "total_amount", "created_at",
+                 "product_id", "product_name", "quantity", "unit_price", "total_price"]
+
+PageFetcher = Callable[[int, int], Awaitable[Tuple[List, Optional[int]]]]
+
+
+async def iter_pages(fetch: PageFetcher, page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[List]:
+    """Pages successives d'une pagination par clé (start -> next_start)"""
+    start = 0
+    while True:
+        items, next_start = await fetch(start, page_size)
+        if items:
+            yield items
+        if next_start is None:
+            return
+        start = next_start
+        # Laisser passer les autres requêtes entre deux pages
+        await anyio.sleep(0)
+
+
+async def ndjson_stream(pages: AsyncIterator[List]) -> AsyncIterator[bytes]:
+    async for items in pages:
+        yield b"".join(item.model_dump_json().encode() + b"\n" for item in items)
+
+
+async def csv_stream(pages: AsyncIterator[List], columns: List[str],
+                     to_rows: Callable[[object], Iterable[list]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for items in pages:
+        for item in items:
+            writer.writerows(to_rows(item))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # En-tête seul (export vide)
+        yield buffer.getvalue().encode()
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(getattr(value, "value", value))
+
+
+def client_rows(client) -> Iterable[list]:
+    address = client.address
+    yield [_text(value) for value in (
+        client.id, client.name, client.email, client.phone, address.street, address.city,
+        address.zip, address.country, client.loyalty_points, client.is_active,
+        client.created_at, client.updated_at
+    )]
+
+
+def order_rows(order) -> Iterable[list]:
+    head = [_text(value) for value in (
+        order.id, order.client_id, order.client_name, order.status, order.total_amount, order.created_at
+    )]
+    for item in order.items:
+        yield head + [_text(value) for value in (
+            item.product_id, item.product_name, item.quantity, item.unit_price, item.total_price
+        )]
+
+
+def export_stream(export_format: str, pages: AsyncIterator[List], columns: List[str],
+                  to_rows: Callable[[object], Iterable[list]]) -> AsyncIterator[bytes]:
+    if export_format == "csv":
+        return csv_stream(pages, columns, to_rows)
+    return ndjson_stream(pages)
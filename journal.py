@@ -0,0 +1,101 @@
+# journal.py
+"""
+Journal des commandes en ajout seul (JSON Lines) pour l'API BuyYourKawa
+Chaque commande (ou lot de commandes) et ses décréments de stock forment un
+seul enregistrement.
+Un thread d'écriture regroupe les enregistrements soumis pendant le fsync
+précédent (group commit) : un seul fsync par lot au lieu d'un par requête.
+Le journal est rejoué au démarrage pour reconstruire les commandes et les stocks
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, Iterator, Optional
+
+_STOP = object()
+
+
+class OrderJournal:
+    """Journal durable avec group commit, alimenté par les handlers async"""
+
+    def __init__(self, path: str, max_batch: int = 512,
+                 on_commit: Optional[Callable[[int], None]] = None):
+        self.path = path
+        self.max_batch = max_batch
+        self._on_commit = on_commit
+        self._queue: "Queue" = Queue()
+        self._file = open(path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._run, name="order-journal", daemon=True)
+        self._writer.start()
+
+    def submit(self, record: dict) -> Future:
+        """Soumettre un enregistrement ; le Future est résolu une fois le lot fsync-é"""
+        future: Future = Future()
+        self._queue.put((json.dumps(record, separators=(",", ":")), future))
+        return future
+
+    async def append(self, record: dict) -> None:
+        """Attendre la durabilité de l'enregistrement sans bloquer la boucle d'événements"""
+        await asyncio.wrap_future(self.submit(record))
+
+    def _next_batch(self) -> list:
+        # Bloque jusqu'au premier enregistrement, puis prend tout ce qui est arrivé entre-temps
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            entries = batch[:-1] if stop else batch
+            if entries:
+                self._commit(entries)
+            if stop:
+                return
+
+    def _commit(self, entries: list) -> None:
+        try:
+            self._file.write("".join(line + "\n" for line, _ in entries))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        if self._on_commit:
+            self._on_commit(len(entries))
+        for _, future in entries:
+            future.set_result(None)
+
+    def close(self) -> None:
+        """Vider la file d'attente, arrêter le thread d'écriture et fermer le fichier"""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._file.close()
+
+
+def replay(path: str) -> Iterator[dict]:
+    """
+    Enregistrements du journal dans l'ordre d'écriture
+    Une dernière ligne incomplète (arrêt brutal pendant l'écriture) est ignorée :
+    la commande correspondante n'avait pas été confirmée au client
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as journal:
+        for line in journal:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
@@ -0,0 +1,47 @@
+# lifecycle.py
+"""
+Cycle de vie des commandes de l'API BuyYourKawa
+pending -> confirmed -> preparing -> ready -> delivered, annulation possible
+tant que la commande n'est pas prête. La table est consultée en O(1) par
+chaque changement de statut
+"""
+from typing import Dict, FrozenSet
+
+from models import OrderStatus
+
+TRANSITIONS: Dict[OrderStatus, FrozenSet[OrderStatus]] = {
+    OrderStatus.PENDING: frozenset({OrderStatus.CONFIRMED, OrderStatus.CANCELLED}),
+    OrderStatus.CONFIRMED: frozenset({OrderStatus.PREPARING, OrderStatus.CANCELLED}),
+    OrderStatus.PREPARING: frozenset({OrderStatus.READY, OrderStatus.CANCELLED}),
+    OrderStatus.READY: frozenset({OrderStatus.DELIVERED}),
+    OrderStatus.DELIVERED: frozenset(),
+    OrderStatus.CANCELLED: frozenset(),
+}
+
+
+class InvalidTransition(Exception):
+    """Changement de statut absent de la table des transitions"""
+
+    def __init__(self, current, target):
+        super().__init__(f"Cannot move order from {OrderStatus(current).value} to {OrderStatus(target).value}")
+        self.current = current
+        self.target = target
+
+
+def check_transition(current, target) -> None:
+    """InvalidTransition si target n'est pas atteignable depuis current"""
+    if OrderStatus(target) not in TRANSITIONS[OrderStatus(current)]:
+        raise InvalidTransition(current, target)
+
+
+def order_quantities(order) -> Dict[str, int]:
+    """Quantités par produit (un produit peut apparaître sur plusieurs lignes)"""
+    quantities: Dict[str, int] = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def counts_in_analytics(order) -> bool:
+    """Les commandes annulées sont exclues du chiffre d'affaires et des quantités vendues"""
+    return order.status != OrderStatus.CANCELLED
@@ -5,6 +5,7 @@ Tests de charge avec corrections des faux échecs et payloads complets
 
 import random
 import json
+import time
 from locust import HttpUser, task, between
 
 
@@ -13,7 +14,7 @@ class BuyYourKawaUser(HttpUser):
     Utilisateur type pour tests de charge BuyYourKawa API - VERSION CORRIGÉE
     Corrections appliquées :
     - Accepte HTTP 200 pour POST /clients et POST /products
-    - Payload complet pour POST /orders avec tous les champs requis
+    - Payload réduit pour POST /orders (client + produits/quantités, prix calculés par le serveur)
     - Gestion d'erreurs améliorée
     """
     wait_time = between(1, 3)
@@ -24,7 +25,7 @@ class BuyYourKawaUser(HttpUser):
         self.client_ids = []
         self.product_ids = []
         self.client_details = {}  # Cache des détails clients
-        self.product_details = {}  # Cache des détails produits
+        self.etags = {}  # ETags reçus, renvoyés en If-None-Match
     
     def authenticate(self):
         """Authentification JWT - endpoint critique à tester"""
@@ -34,12 +35,37 @@ class BuyYourKawaUser(HttpUser):
         })
         
         if response.status_code == 200:
-            self.token = response.json().get("access_token")
-            self.headers = {"Authorization": f"Bearer {self.token}"}
+            self.store_tokens(response.json())
         else:
-            self.headers = {}
+            self._headers = {}
+            self.refresh_token = None
             print(f"Échec authentification: {response.status_code}")
     
+    def store_tokens(self, tokens):
+        """Mémoriser l'access token, son expiration et le refresh token"""
+        self.token = tokens.get("access_token")
+        self.token_expires_at = time.time() + tokens.get("expires_in", 0)
+        self.refresh_token = tokens.get("refresh_token", getattr(self, "refresh_token", None))
+        self._headers = {"Authorization": f"Bearer {self.token}"}
+    
+    @property
+    def headers(self):
+        """En-têtes d'authentification, rafraîchis via /token/refresh avant expiration"""
+        if self.refresh_token and time.time() > self.token_expires_at - 60:
+            response = self.client.post("/token/refresh", json={"refresh_token": self.refresh_token})
+            if response.status_code == 200:
+                self.store_tokens(response.json())
+            else:
+                self.authenticate()
+        return self._headers
+    
+    def conditional_headers(self, path):
+        """En-têtes avec If-None-Match si un ETag est connu pour ce chemin"""
+        etag = self.etags.get(path)
+        if etag:
+            return {**self.headers, "If-None-Match": etag}
+        return self.headers
+    
     @task(3)
     def get_clients_list(self):
         """Test GET /clients - endpoint fréquemment utilisé"""
@@ -47,7 +73,7 @@ class BuyYourKawaUser(HttpUser):
                            headers=self.headers,
                            catch_response=True) as response:
             if response.status_code == 200:
-                clients = response.json()
+                clients = response.json().get("items", [])
                 if clients:
                     # Stocker quelques IDs et détails pour les tests suivants
                     for client in clients[:5]:
@@ -64,12 +90,16 @@ class BuyYourKawaUser(HttpUser):
         if self.client_ids:
             client_id = random.choice(self.client_ids)
             with self.client.get(f"/clients/{client_id}", 
-                               headers=self.headers,
+                               headers=self.conditional_headers(f"/clients/{client_id}"),
+                               name="/clients/{id}",
                                catch_response=True) as response:
                 if response.status_code == 200:
                     # Mettre à jour le cache des détails
                     self.client_details[client_id] = response.json()
+                    self.etags[f"/clients/{client_id}"] = response.headers.get("ETag")
                     response.success()
+                elif response.status_code == 304:
+                    response.success()  # Détails inchangés, cache local valide
                 elif response.status_code == 404:
                     response.success()  # 404 acceptable si client supprimé
                 else:
@@ -138,7 +168,7 @@ class BuyYourKawaUser(HttpUser):
     def get_products(self):
         """Test GET /products - consultation produits"""
         with self.client.get("/products", 
-                           headers=self.headers,
+                           headers=self.conditional_headers("/products"),
                            catch_response=True) as response:
             if response.status_code == 200:
                 products = response.json()
@@ -147,8 +177,10 @@ class BuyYourKawaUser(HttpUser):
                     for product in products[:10]:
                         if product.get("id"):
                             self.product_ids.append(product["id"])
-                            self.product_details[product["id"]] = product
+                self.etags["/products"] = response.headers.get("ETag")
                 response.success()
+            elif response.status_code == 304:
+                response.success()  # Catalogue inchangé depuis la dernière lecture
             else:
                 response.failure(f"Got status {response.status_code}")
     
@@ -173,14 +205,13 @@ class BuyYourKawaUser(HttpUser):
                 product = response.json()
                 if product.get("id"):
                     self.product_ids.append(product["id"])
-                    self.product_details[product["id"]] = product
                 response.success()
             else:
                 response.failure(f"Got status {response.status_code}: {response.text}")
     
     @task(1)
     def create_order(self):
-        """Test POST /orders - création commande (CORRIGÉ: payload complet)"""
+        """Test POST /orders - création commande (payload réduit, prix fixés par le serveur)"""
         if self.client_ids and self.product_ids:
             # Sélectionner un client et des produits
             client_id = random.choice(self.client_ids)
@@ -189,34 +220,13 @@ class BuyYourKawaUser(HttpUser):
                 min(3, len(self.product_ids))
             )
             
-            # CORRECTION: Construire payload complet avec tous les champs requis
-            client_info = self.client_details.get(client_id, {})
-            
-            total_amount = 0
-            items_with_details = []
-            
-            for product_id in selected_products:
-                product_info = self.product_details.get(product_id, {})
-                quantity = random.randint(1, 3)
-                unit_price = product_info.get("price", 5.0)
-                total_price = unit_price * quantity
-                total_amount += total_price
-                
-                items_with_details.append({
-                    "product_id": product_id,
-                    "product_name": product_info.get("name", f"Product {product_id}"),
-                    "quantity": quantity,
-                    "unit_price": unit_price,
-                    "total_price": total_price
-                })
-            
-            # Payload complet avec tous les champs requis
+            # Noms, prix et totaux sont calculés par l'API à partir du catalogue
             order_data = {
                 "client_id": client_id,
-                "client_name": client_info.get("name", f"Client {client_id}"),
-                "items": items_with_details,
-                "total_amount": round(total_amount, 2),
-                "status": "pending"
+                "items": [
+                    {"product_id": product_id, "quantity": random.randint(1, 3)}
+                    for product_id in selected_products
+                ]
             }
             
             with self.client.post("/orders", 
@@ -231,6 +241,43 @@ class BuyYourKawaUser(HttpUser):
             # Pas assez de données pour créer une commande
             pass
     
+    @task(2)
+    def advance_kitchen_queue(self):
+        """Test du poste barista : prochaine commande d'une file, puis passage au statut suivant"""
+        status, next_status = random.choice([
+            ("pending", "confirmed"),
+            ("confirmed", "preparing"),
+            ("preparing", "ready"),
+            ("ready", "delivered")
+        ])
+        with self.client.get("/orders/next",
+                           params={"status": status},
+                           headers=self.headers,
+                           name="/orders/next",
+                           catch_response=True) as response:
+            if response.status_code == 404:
+                response.success()  # File vide
+                return
+            if response.status_code != 200:
+                response.failure(f"Got status {response.status_code}")
+                return
+            response.success()
+            order_id = response.json()["id"]
+
+        # Annulation occasionnelle avant préparation (remise en stock)
+        if status in ("pending", "confirmed") and random.random() < 0.1:
+            next_status = "cancelled"
+        with self.client.post(f"/orders/{order_id}/status",
+                            json={"status": next_status},
+                            headers=self.headers,
+                            name="/orders/{id}/status",
+                            catch_response=True) as response:
+            # 409 : un autre barista a déjà fait avancer la commande
+            if response.status_code in [200, 409]:
+                response.success()
+            else:
+                response.failure(f"Got status {response.status_code}: {response.text}")
+    
     @task(2)
     def get_orders(self):
         """Test GET /orders - consultation commandes"""
@@ -309,7 +356,8 @@ def run_test_scenario(scenario="normal"):
 # CORRECTIONS APPLIQUÉES :
 # POST /clients : Accepte maintenant HTTP 200 (pas seulement 201)
 # POST /products : Accepte maintenant HTTP 200 (pas seulement 201)  
-# POST /orders : Payload complet avec client_name, unit_price, total_price, product_name
+# POST /orders : Payload réduit (client_id + produits/quantités), prix et totaux calculés par l'API
 # GET /analytics : Paramètres étendus avec start_date et end_date
-# Cache des détails clients/produits pour éviter les requêtes répétées
+# File barista : GET /orders/next + POST /orders/{id}/status (transitions et annulations)
+# Cache des détails clients pour éviter les requêtes répétées
 # Gestion d'erreurs améliorée avec messages détaillés
@@ -0,0 +1,50 @@
+"""
+Locust Load Testing - BuyYourKawa API - TEMPÊTE DE CONNEXIONS
+Mesure isolée du débit de /token et /token/refresh à fort spawn rate (50+/s)
+"""
+
+from locust import HttpUser, task, constant
+
+
+class TokenStormUser(HttpUser):
+    """
+    Utilisateur qui ne fait que s'authentifier
+    Reproduit les on_start simultanés des autres scénarios lors d'un spawn massif
+    """
+    wait_time = constant(0.5)
+
+    def on_start(self):
+        """Connexion initiale, comme dans locustfile_corrected.py"""
+        self.refresh_token = None
+        self.login()
+
+    @task(3)
+    def login(self):
+        """Test POST /token - émission access + refresh token"""
+        with self.client.post("/token", data={
+            "username": "admin",
+            "password": "password"
+        }, catch_response=True) as response:
+            if response.status_code == 200:
+                self.refresh_token = response.json().get("refresh_token")
+                response.success()
+            else:
+                response.failure(f"Got status {response.status_code}")
+
+    @task(1)
+    def refresh(self):
+        """Test POST /token/refresh - ré-authentification sans mot de passe"""
+        if not self.refresh_token:
+            return
+        with self.client.post("/token/refresh",
+                              json={"refresh_token": self.refresh_token},
+                              catch_response=True) as response:
+            if response.status_code == 200:
+                response.success()
+            else:
+                response.failure(f"Got status {response.status_code}")
+
+
+# Usage :
+# locust -f locustfile_token.py --host=http://localhost:8000 --users 500 --spawn-rate 50 -t 60s --headless --html=reporting/token_storm.html --csv=reporting/token_storm
+# ou : python run_load_tests.py token_storm
@@ -1,39 +1,123 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Header, Response, Body
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from prometheus_client import Counter, Histogram, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram
 from models import (
-    Client, Address, Product, Order, OrderItem, Analytics, 
-    Inventory, StockMovement, OrderStatus, ProductCategory
+    Client, Address, Product, Order, OrderCreate, OrderItem, OrderStatusUpdate, Analytics, 
+    Inventory, StockMovement, OrderStatus, ProductCategory, ClientPage, OrderPage,
+    TokenRefreshRequest, BulkCreateResult, AnalyticsBucket
 )
+from auth import TokenCache, IssuedTokenCache
+from cache import ResponseCache, make_etag, etag_matches
+from analytics import AnalyticsAggregates, TimeBucketedAnalytics, resolve_period
+from columnar import ColumnarOrderItems
+from repositories import encode_cursor, decode_cursor, ProductNotFound, InsufficientStock
+from journal import OrderJournal, replay
+from lifecycle import InvalidTransition, check_transition, order_quantities
+from metrics import MetricsMiddleware, ExpositionCache, metrics_registry, start_metrics_server, sla_buckets
+from quantiles import LatencyQuantiles
+from serialization import DEFAULT_RESPONSE_CLASS, fast_response, type_adapter
+from export import (
+    MEDIA_TYPES, CLIENT_COLUMNS, ORDER_COLUMNS, iter_pages, export_stream, client_rows, order_rows
+)
+from config import (
+    THREADPOOL_SIZE, STORAGE_BACKEND, SQLITE_PATH, ORDER_JOURNAL_PATH, API_WORKERS, API_HOST, API_PORT,
+    METRICS_PORT, SLA_FILES, LATENCY_BUCKETS
+)
+from pydantic import ValidationError
+from storage import (
+    AsyncRepository, AsyncProductRepository, AsyncOrderRepository, configure_threadpool,
+    create_repositories
+)
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import asyncio
+import os
 import uuid
+import time
 import jwt
 import random
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
+# Access token court, refresh token long : les clients se ré-authentifient sans /token
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+# Fenêtre de réutilisation d'une paire de tokens lors des rafales de connexion
+TOKEN_REUSE_SECONDS = 5
+
+async def publish_latency_quantiles():
+    while True:
+        await asyncio.sleep(latency_quantiles.sync_interval)
+        latency_quantiles.sync(force=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Les handlers sont async ; le threadpool ne sert plus qu'aux chemins synchrones restants
+    configure_threadpool(THREADPOOL_SIZE)
+    metrics_server = start_metrics_server(METRICS_PORT, exposition.registry) if METRICS_PORT else None
+    # Multiprocess : un worker inactif publie quand même ses dernières latences
+    publisher = asyncio.create_task(publish_latency_quantiles()) if latency_quantiles.shared_dir else None
+    yield
+    if publisher:
+        publisher.cancel()
+    if metrics_server:
+        metrics_server[0].shutdown()
+    if order_journal:
+        order_journal.close()
 
 app = FastAPI(
     title="BuyYourKawa API",
     description="API de gestion complète pour coffee shop",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=DEFAULT_RESPONSE_CLASS
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Prometheus metrics
-REQUEST_COUNT = Counter('request_count', 'Total number of requests', ['method', 'endpoint'])
-REQUEST_LATENCY = Histogram('request_latency_seconds', 'Request latency', ['method', 'endpoint'])
+# Étiquette endpoint = modèle de route (cardinalité bornée), status = classe 2xx/3xx/4xx/5xx
+REQUEST_COUNT = Counter('request_count', 'Total number of requests', ['method', 'endpoint', 'status'])
+# Buckets alignés sur les cibles SLA des scénarios (200 ms, 500 ms, 800 ms, 2 s, ...)
+REQUEST_LATENCY = Histogram('request_latency_seconds', 'Request latency', ['method', 'endpoint'],
+                            buckets=sla_buckets(SLA_FILES, LATENCY_BUCKETS))
 REQUEST_SUCCESS = Counter('request_success', 'Number of successful requests', ['method', 'endpoint'])
 REQUEST_FAILURE = Counter('request_failure', 'Number of failed requests', ['method', 'endpoint'])
+CACHE_HITS = Counter('response_cache_hits', 'Number of response cache hits', ['endpoint'])
+CACHE_MISSES = Counter('response_cache_misses', 'Number of response cache misses', ['endpoint'])
+JWT_CACHE_HITS = Counter('jwt_cache_hits', 'Number of JWT verifications served from cache')
+JWT_CACHE_MISSES = Counter('jwt_cache_misses', 'Number of JWT verifications requiring jwt.decode')
+JOURNAL_BATCH_SIZE = Histogram('order_journal_batch_size', 'Orders written per journal fsync',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+# Percentiles serveur en flux (p50/p95/p99), à comparer aux rapports Locust
+# (fusionnés entre workers via le répertoire multiprocess)
+latency_quantiles = LatencyQuantiles(shared_dir=os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
 
-# Bases de données simulées en mémoire
-clients_db = []
-products_db = []
-orders_db = []
+# Sortie de /metrics mise en cache entre deux scrapes sans nouvelle requête mesurée
+exposition = ExpositionCache(metrics_registry(), enabled="PROMETHEUS_MULTIPROC_DIR" not in os.environ)
+
+# Cache des réponses en lecture (catalogue, analytics), invalidé par les écritures
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 1024
+response_cache = ResponseCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    on_hit=lambda endpoint: CACHE_HITS.labels(endpoint).inc(),
+    on_miss=lambda endpoint: CACHE_MISSES.labels(endpoint).inc()
+)
+
+# Bases de données (indexées par id) : en mémoire ou SQLite selon STORAGE_BACKEND
+clients_db, products_db, orders_db = create_repositories(STORAGE_BACKEND, SQLITE_PATH)
 stock_movements_db = []
 
+# Interface asynchrone utilisée par les handlers (threadpool pour SQLite)
+client_store = AsyncRepository(clients_db)
+product_store = AsyncProductRepository(products_db)
+order_store = AsyncOrderRepository(orders_db)
+
 # Données de test initiales
 def init_sample_data():
     # Produits de base
@@ -44,30 +128,106 @@ def init_sample_data():
         Product(id="4", name="Thé Earl Grey", description="Thé noir aromatisé", price=2.20, category=ProductCategory.TEA, stock_quantity=60),
         Product(id="5", name="Sandwich Jambon", description="Sandwich jambon beurre", price=4.50, category=ProductCategory.SANDWICH, stock_quantity=30)
     ]
-    products_db.extend(sample_products)
+    # Un backend persistant peut déjà contenir le catalogue (insertion idempotente)
+    products_db.seed(sample_products)
 
 init_sample_data()
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    method = request.method
-    endpoint = request.url.path
-    REQUEST_COUNT.labels(method, endpoint).inc()
-    with REQUEST_LATENCY.labels(method, endpoint).time():
-        response = await call_next(request)
-        if 200 <= response.status_code < 300:
-            REQUEST_SUCCESS.labels(method, endpoint).inc()
-        else:
-            REQUEST_FAILURE.labels(method, endpoint).inc()
-    return response
+def replay_order_journal(path: str):
+    """Rejouer les commandes journalisées, leurs changements de statut et les mouvements de stock"""
+    for record in replay(path):
+        if "transition" in record:
+            # Changement de statut ; une annulation remet les quantités en stock
+            transition = record["transition"]
+            try:
+                orders_db.transition(transition["id"], transition["status"],
+                                     datetime.fromisoformat(transition["updated_at"]))
+            except InvalidTransition:
+                pass
+            continue
+        # Un enregistrement contient une commande, ou un lot (POST /orders/bulk)
+        orders = [Order.model_validate(order) for order in (record["orders"] if "orders" in record else [record["order"]])]
+        if not orders or orders[0].id in orders_db:
+            continue
+        for product_id, quantity in record["stock"].items():
+            product = products_db.get(product_id)
+            if product:
+                product.stock_quantity -= quantity
+                products_db.update(product)
+        orders_db.add_many(orders)
+    products_db.touch()
+
+# Journal des commandes : durabilité du backend en mémoire (group commit)
+order_journal = None
+if ORDER_JOURNAL_PATH and STORAGE_BACKEND == "memory":
+    replay_order_journal(ORDER_JOURNAL_PATH)
+    def record_journal_batch(size: int):
+        JOURNAL_BATCH_SIZE.observe(size)
+        exposition.mark_changed()
 
-def create_access_token(data: dict):
+    order_journal = OrderJournal(ORDER_JOURNAL_PATH, on_commit=record_journal_batch)
+
+# Backend partagé (sqlite) : chaque worker ne voit que ses propres commandes,
+# les analytics sont donc calculées par la base et communes à tous les processus
+SHARED_ANALYTICS = STORAGE_BACKEND != "memory"
+
+# Agrégats analytics mis à jour à chaque commande (global et par heure/jour),
+# reconstruits au démarrage depuis les commandes journalisées
+history = [] if SHARED_ANALYTICS else orders_db.all()
+analytics_aggregates = AnalyticsAggregates.from_orders(history)
+analytics_buckets = TimeBucketedAnalytics.from_orders(history)
+# Lignes de commande en colonnes : ventilations par heure/jour vectorisées
+analytics_columns = ColumnarOrderItems.from_orders(history)
+
+app.add_middleware(
+    MetricsMiddleware,
+    count=REQUEST_COUNT,
+    latency=REQUEST_LATENCY,
+    success=REQUEST_SUCCESS,
+    failure=REQUEST_FAILURE,
+    excluded_paths={"/metrics", "/metrics/latency"},
+    on_request=exposition.mark_changed,
+    quantiles=latency_quantiles
+)
+
+# Cache des tokens vérifiés (une vérification de signature par token)
+JWT_CACHE_MAX_ENTRIES = 10000
+token_cache = TokenCache(
+    max_entries=JWT_CACHE_MAX_ENTRIES,
+    on_hit=JWT_CACHE_HITS.inc,
+    on_miss=JWT_CACHE_MISSES.inc
+)
+
+issued_tokens = IssuedTokenCache(reuse_seconds=TOKEN_REUSE_SECONDS)
+
+def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=24)
+    expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(username: str):
+    return create_access_token(
+        data={"sub": username, "type": "refresh"},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+def issue_access_token(username: str):
+    """Créer un access token et l'enregistrer comme déjà vérifié"""
+    expires_at = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    access_token = create_access_token(data={"sub": username})
+    token_cache.set(access_token, username, expires_at)
+    return access_token, expires_at
+
+def token_response(access_token: str, expires_at: float, refresh_token: str):
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": max(int(expires_at - time.time()), 0),
+        "refresh_token": refresh_token
+    }
+
 def authenticate_user(username: str, password: str):
     # Simulation d'authentification simple
     if username == "admin" and password == "password":
@@ -75,11 +235,15 @@ def authenticate_user(username: str, password: str):
     return None
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
+    username = token_cache.get(token)
+    if username is not None:
+        return username
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("type") == "refresh":
             raise HTTPException(status_code=401, detail="Invalid token payload")
+        token_cache.set(token, username, payload["exp"])
         return username
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
@@ -90,47 +254,146 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
 # ROUTE 1: Authentification
 # ============================================================================
 @app.post("/token", tags=["Authentication"])
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    """Authentification et génération de token JWT"""
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    """Authentification et génération des tokens JWT (access + refresh)"""
     user = authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user["username"]})
-    return {"access_token": access_token, "token_type": "bearer"}
+
+    # Chemin rapide : paire émise il y a moins de TOKEN_REUSE_SECONDS pour cet utilisateur
+    tokens = issued_tokens.get(user["username"])
+    if tokens is None:
+        access_token, expires_at = issue_access_token(user["username"])
+        tokens = {
+            "access_token": access_token,
+            "expires_at": expires_at,
+            "refresh_token": create_refresh_token(user["username"])
+        }
+        issued_tokens.set(user["username"], tokens)
+    return token_response(tokens["access_token"], tokens["expires_at"], tokens["refresh_token"])
+
+@app.post("/token/refresh", tags=["Authentication"])
+async def refresh_token(request: TokenRefreshRequest):
+    """Échanger un refresh token contre un nouvel access token"""
+    try:
+        payload = jwt.decode(request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Refresh token has expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    username = payload.get("sub")
+    if username is None or payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    access_token, expires_at = issue_access_token(username)
+    return token_response(access_token, expires_at, request.refresh_token)
 
 # ============================================================================
 # ROUTES 2-5: Gestion des clients (CRUD)
 # ============================================================================
 @app.post("/clients", response_model=Client, tags=["Clients"])
-def create_client(client: Client, token: str = Depends(oauth2_scheme)):
+async def create_client(client: Client, token: str = Depends(oauth2_scheme)):
     """Créer un nouveau client"""
     current_user = get_current_user(token)
     client.id = str(uuid.uuid4())
     client.created_at = datetime.now()
     client.updated_at = datetime.now()
-    clients_db.append(client)
+    await client_store.add(client)
+    response_cache.invalidate("/analytics")
     return client
 
-@app.get("/clients", response_model=List[Client], tags=["Clients"])
-def get_clients(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), token: str = Depends(oauth2_scheme)):
-    """Récupérer la liste des clients avec pagination"""
+# Taille maximale d'un lot pour les endpoints /bulk
+BULK_MAX_ITEMS = 5000
+
+def validate_bulk(model, payload: List[dict]) -> list:
+    """
+    Valider un lot en une passe ; les erreurs sont regroupées par index d'élément
+    et le lot entier est refusé (422) si au moins un élément est invalide
+    """
+    if not payload:
+        raise HTTPException(status_code=422, detail="Bulk requests must contain at least one item")
+    if len(payload) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {BULK_MAX_ITEMS} items")
+    try:
+        return type_adapter(List[model]).validate_python(payload)
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors(include_url=False, include_context=False):
+            index, *loc = error["loc"]
+            errors.setdefault(index, []).append({"loc": loc, "msg": error["msg"], "type": error["type"]})
+        raise HTTPException(status_code=422, detail=bulk_errors(errors))
+
+def bulk_errors(errors: dict) -> List[dict]:
+    return [{"index": index, "errors": item_errors} for index, item_errors in sorted(errors.items())]
+
+def stamp_new(entities: list) -> None:
+    """Identifiants et dates attribués par le serveur, comme pour une création unitaire"""
+    now = datetime.now()
+    for entity in entities:
+        entity.id = str(uuid.uuid4())
+        entity.created_at = now
+        entity.updated_at = now
+
+@app.post("/clients/bulk", response_model=BulkCreateResult, tags=["Clients"])
+async def create_clients_bulk(payload: List[dict] = Body(...), token: str = Depends(oauth2_scheme)):
+    """Créer un lot de clients (validation en une passe, insertion atomique)"""
+    current_user = get_current_user(token)
+    clients = validate_bulk(Client, payload)
+    stamp_new(clients)
+    await client_store.add_many(clients)
+    response_cache.invalidate("/analytics")
+    return BulkCreateResult(created=len(clients), ids=[c.id for c in clients])
+
+def parse_cursor(cursor: Optional[str]) -> int:
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/clients", response_model=ClientPage, tags=["Clients"])
+async def get_clients(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, token: str = Depends(oauth2_scheme)):
+    """Récupérer la liste des clients avec pagination par curseur (skip conservé pour compatibilité)"""
+    current_user = get_current_user(token)
+    if cursor:
+        clients, next_start = await client_store.page_after(parse_cursor(cursor), limit)
+    else:
+        clients, next_start = await client_store.page_from_offset(skip, limit)
+    return fast_response(ClientPage(
+        items=clients,
+        next_cursor=encode_cursor(next_start) if next_start is not None else None
+    ), ClientPage)
+
+def export_response(export_format: str, name: str, pages, columns, to_rows) -> StreamingResponse:
+    return StreamingResponse(
+        export_stream(export_format, pages, columns, to_rows),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+# Déclarée avant /clients/{client_id} pour ne pas être capturée comme un id
+@app.get("/clients/export", tags=["Clients"])
+async def export_clients(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), token: str = Depends(oauth2_scheme)):
+    """Exporter tous les clients en flux NDJSON ou CSV (mémoire constante)"""
     current_user = get_current_user(token)
-    return clients_db[skip:skip + limit]
+    return export_response(format, "clients", iter_pages(client_store.page_after), CLIENT_COLUMNS, client_rows)
 
 @app.get("/clients/{client_id}", response_model=Client, tags=["Clients"])
-def get_client(client_id: str, token: str = Depends(oauth2_scheme)):
-    """Récupérer un client spécifique"""
+async def get_client(client_id: str, response: Response, if_none_match: Optional[str] = Header(None), token: str = Depends(oauth2_scheme)):
+    """Récupérer un client spécifique (304 si l'ETag fourni est toujours valide)"""
     current_user = get_current_user(token)
-    client = next((c for c in clients_db if c.id == client_id), None)
+    client = await client_store.get(client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
+    etag = make_etag(client.id, client.updated_at.timestamp())
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return client
 
 @app.put("/clients/{client_id}", response_model=Client, tags=["Clients"])
-def update_client(client_id: str, client: Client, token: str = Depends(oauth2_scheme)):
+async def update_client(client_id: str, client: Client, token: str = Depends(oauth2_scheme)):
     """Mettre à jour un client"""
     current_user = get_current_user(token)
-    stored_client = next((c for c in clients_db if c.id == client_id), None)
+    stored_client = await client_store.get(client_id)
     if not stored_client:
         raise HTTPException(status_code=404, detail="Client not found")
     
@@ -142,127 +405,383 @@ def update_client(client_id: str, client: Client, token: str = Depends(oauth2_sc
     stored_client.loyalty_points = client.loyalty_points
     stored_client.is_active = client.is_active
     stored_client.updated_at = datetime.now()
-    return stored_client
+    return await client_store.update(stored_client)
 
 # ============================================================================
 # ROUTES 6-7: Gestion des produits
 # ============================================================================
 @app.get("/products", response_model=List[Product], tags=["Products"])
-def get_products(category: Optional[ProductCategory] = None, available_only: bool = True, token: str = Depends(oauth2_scheme)):
-    """Récupérer la liste des produits avec filtres"""
+async def get_products(response: Response, category: Optional[ProductCategory] = None, available_only: bool = True, if_none_match: Optional[str] = Header(None), token: str = Depends(oauth2_scheme)):
+    """Récupérer la liste des produits avec filtres (304 si le catalogue n'a pas changé)"""
     current_user = get_current_user(token)
-    filtered_products = products_db
-    
-    if category:
-        filtered_products = [p for p in filtered_products if p.category == category]
-    if available_only:
-        filtered_products = [p for p in filtered_products if p.is_available and p.stock_quantity > 0]
-    
-    return filtered_products
+    version = await product_store.current_version()
+    etag = make_etag("products", version, category.value if category else "all", int(available_only))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    # La version dans la clé invalide aussi les écritures faites par les autres workers
+    key = (version, category, available_only)
+    products = response_cache.get("/products", key)
+    if products is None:
+        products = await product_store.filter(category, available_only)
+        response_cache.set("/products", key, products)
+    return fast_response(products, List[Product], headers={"ETag": etag})
 
 @app.post("/products", response_model=Product, tags=["Products"])
-def create_product(product: Product, token: str = Depends(oauth2_scheme)):
+async def create_product(product: Product, token: str = Depends(oauth2_scheme)):
     """Créer un nouveau produit"""
     current_user = get_current_user(token)
     product.id = str(uuid.uuid4())
     product.created_at = datetime.now()
     product.updated_at = datetime.now()
-    products_db.append(product)
+    await product_store.add(product)
+    response_cache.invalidate("/products")
     return product
 
+@app.post("/products/bulk", response_model=BulkCreateResult, tags=["Products"])
+async def create_products_bulk(payload: List[dict] = Body(...), token: str = Depends(oauth2_scheme)):
+    """Créer un lot de produits (validation en une passe, insertion atomique)"""
+    current_user = get_current_user(token)
+    products = validate_bulk(Product, payload)
+    stamp_new(products)
+    await product_store.add_many(products)
+    response_cache.invalidate("/products")
+    return BulkCreateResult(created=len(products), ids=[p.id for p in products])
+
 # ============================================================================
 # ROUTES 8-9: Gestion des commandes
 # ============================================================================
+def price_order(request: OrderCreate, client: Client, products: dict) -> Order:
+    """
+    Commande complète construite en une passe à partir du catalogue :
+    noms et prix viennent des produits réservés, jamais du payload
+    """
+    items = []
+    total = 0.0
+    for line in request.items:
+        product = products[line.product_id]
+        line_total = round(product.price * line.quantity, 2)
+        total += line_total
+        items.append(OrderItem.model_construct(
+            product_id=product.id, product_name=product.name, quantity=line.quantity,
+            unit_price=product.price, total_price=line_total
+        ))
+    # Données déjà validées (payload + catalogue) : pas de seconde validation
+    return Order.model_construct(
+        client_id=client.id, client_name=client.name, items=items,
+        total_amount=round(total, 2), status=OrderStatus.PENDING, notes=request.notes
+    )
+
+async def reserve_stock(quantities: dict) -> dict:
+    """Réserver les stocks ; retourne les produits réservés indexés par id"""
+    try:
+        products = await product_store.reserve(quantities)
+    except ProductNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InsufficientStock as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {product.id: product for product in products}
+
 @app.post("/orders", response_model=Order, tags=["Orders"])
-def create_order(order: Order, token: str = Depends(oauth2_scheme)):
-    """Créer une nouvelle commande"""
+async def create_order(request: OrderCreate, token: str = Depends(oauth2_scheme)):
+    """Créer une nouvelle commande (prix et totaux calculés par le serveur)"""
     current_user = get_current_user(token)
     
     # Vérifier que le client existe
-    client = next((c for c in clients_db if c.id == order.client_id), None)
+    client = await client_store.get(request.client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Vérifier la disponibilité des produits
-    for item in order.items:
-        product = next((p for p in products_db if p.id == item.product_id), None)
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        if product.stock_quantity < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock for {product.name}")
+    # Vérifier et réserver les stocks en une passe (verrous par produit)
+    quantities = order_quantities(request)
+    products = await reserve_stock(quantities)
     
     # Créer la commande
+    order = price_order(request, client, products)
     order.id = str(uuid.uuid4())
     order.created_at = datetime.now()
     order.updated_at = datetime.now()
-    orders_db.append(order)
-    
-    # Mettre à jour les stocks
-    for item in order.items:
-        product = next((p for p in products_db if p.id == item.product_id), None)
-        product.stock_quantity -= item.quantity
+    if order_journal:
+        # Commande + décréments de stock en un seul enregistrement, confirmé après fsync
+        try:
+            await order_journal.append({"order": order.model_dump(mode="json"), "stock": quantities})
+        except Exception:
+            # Commande non durable donc refusée : le stock réservé est rendu
+            await product_store.release(quantities)
+            raise
+    await order_store.add(order)
+    if not SHARED_ANALYTICS:
+        analytics_aggregates.record_order(order)
+        analytics_buckets.record_order(order)
+        analytics_columns.record_order(order)
     
+    response_cache.invalidate("/products", "/analytics")
     return order
 
-@app.get("/orders", response_model=List[Order], tags=["Orders"])
-def get_orders(status: Optional[OrderStatus] = None, client_id: Optional[str] = None, token: str = Depends(oauth2_scheme)):
-    """Récupérer les commandes avec filtres"""
+@app.post("/orders/bulk", response_model=BulkCreateResult, tags=["Orders"])
+async def create_orders_bulk(payload: List[dict] = Body(...), token: str = Depends(oauth2_scheme)):
+    """
+    Créer un lot de commandes : clients vérifiés par élément, stocks de tout le lot
+    réservés en une seule opération, puis insertion atomique
+    """
     current_user = get_current_user(token)
-    filtered_orders = orders_db
-    
-    if status:
-        filtered_orders = [o for o in filtered_orders if o.status == status]
-    if client_id:
-        filtered_orders = [o for o in filtered_orders if o.client_id == client_id]
-    
-    return filtered_orders
+    requests = validate_bulk(OrderCreate, payload)
+
+    errors = {}
+    clients = {}
+    for client_id in {request.client_id for request in requests}:
+        clients[client_id] = await client_store.get(client_id)
+        if clients[client_id] is None:
+            for index, request in enumerate(requests):
+                if request.client_id == client_id:
+                    errors.setdefault(index, []).append({"loc": ["client_id"], "msg": "Client not found", "type": "not_found"})
+    if errors:
+        raise HTTPException(status_code=422, detail=bulk_errors(errors))
+
+    quantities = {}
+    for request in requests:
+        for product_id, quantity in order_quantities(request).items():
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    try:
+        products = {product.id: product for product in await product_store.reserve(quantities)}
+    except (ProductNotFound, InsufficientStock) as e:
+        product_id = e.product_id if isinstance(e, ProductNotFound) else e.product.id
+        for index, request in enumerate(requests):
+            if any(item.product_id == product_id for item in request.items):
+                errors.setdefault(index, []).append({"loc": ["items"], "msg": str(e), "type": "stock"})
+        raise HTTPException(status_code=422, detail=bulk_errors(errors))
+
+    orders = [price_order(request, clients[request.client_id], products) for request in requests]
+    stamp_new(orders)
+    if order_journal:
+        try:
+            await order_journal.append({"orders": [o.model_dump(mode="json") for o in orders], "stock": quantities})
+        except Exception:
+            await product_store.release(quantities)
+            raise
+    await order_store.add_many(orders)
+    if not SHARED_ANALYTICS:
+        for order in orders:
+            analytics_aggregates.record_order(order)
+            analytics_buckets.record_order(order)
+            analytics_columns.record_order(order)
+
+    response_cache.invalidate("/products", "/analytics")
+    return BulkCreateResult(created=len(orders), ids=[o.id for o in orders])
+
+@app.get("/orders", response_model=OrderPage, tags=["Orders"])
+async def get_orders(status: Optional[OrderStatus] = None, client_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, token: str = Depends(oauth2_scheme)):
+    """Récupérer les commandes avec filtres et pagination par curseur"""
+    current_user = get_current_user(token)
+    orders, next_start = await order_store.find_page(
+        status=status or None,
+        client_id=client_id or None,
+        start=parse_cursor(cursor),
+        limit=limit
+    )
+    return fast_response(OrderPage(
+        items=orders,
+        next_cursor=encode_cursor(next_start) if next_start is not None else None
+    ), OrderPage)
+
+@app.get("/orders/export", tags=["Orders"])
+async def export_orders(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), status: Optional[OrderStatus] = None, client_id: Optional[str] = None, token: str = Depends(oauth2_scheme)):
+    """Exporter les commandes filtrées en flux NDJSON ou CSV (une ligne CSV par article)"""
+    current_user = get_current_user(token)
+
+    async def fetch(start: int, limit: int):
+        return await order_store.find_page(status=status, client_id=client_id, start=start, limit=limit)
+
+    return export_response(format, "orders", iter_pages(fetch), ORDER_COLUMNS, order_rows)
+
+# ============================================================================
+# ROUTES 8 bis: Cycle de vie des commandes (file du barista)
+# ============================================================================
+@app.get("/orders/next", response_model=Order, tags=["Orders"])
+async def get_next_order(status: OrderStatus = OrderStatus.CONFIRMED, token: str = Depends(oauth2_scheme)):
+    """Plus ancienne commande d'un statut : la prochaine à préparer par défaut (confirmed)"""
+    current_user = get_current_user(token)
+    order = await order_store.next_with_status(status)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"No {status.value} order in queue")
+    return order
+
+# Commandes dont un changement de statut est en cours d'écriture au journal
+orders_in_transition = set()
+
+@app.post("/orders/{order_id}/status", response_model=Order, tags=["Orders"])
+async def change_order_status(order_id: str, update: OrderStatusUpdate, token: str = Depends(oauth2_scheme)):
+    """
+    Faire avancer une commande dans son cycle de vie (409 si la transition est interdite)
+    Une annulation remet les articles en stock et retire la commande des analytics.
+    La transition est journalisée avant d'être appliquée : si l'écriture du journal
+    échoue, la requête échoue et ni le statut, ni le stock, ni les analytics ne changent
+    """
+    current_user = get_current_user(token)
+    if order_id in orders_in_transition:
+        raise HTTPException(status_code=409, detail="Order status is being updated")
+    orders_in_transition.add(order_id)
+    try:
+        order = await order_store.get(order_id)
+        if order is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        try:
+            check_transition(order.status, update.status)
+        except InvalidTransition as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        updated_at = datetime.now()
+        if order_journal:
+            await order_journal.append({
+                "transition": {"id": order_id, "status": update.status.value, "updated_at": updated_at.isoformat()}
+            })
+        try:
+            # Revérifiée par le repository (autre worker sur un backend partagé) ;
+            # une annulation remet le stock dans la même opération
+            order = await order_store.transition(order_id, update.status, updated_at)
+        except InvalidTransition as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        orders_in_transition.discard(order_id)
+
+    if update.status == OrderStatus.CANCELLED:
+        if not SHARED_ANALYTICS:
+            analytics_aggregates.remove_order(order)
+            analytics_buckets.remove_order(order)
+            analytics_columns.remove_order(order)
+        response_cache.invalidate("/products", "/analytics")
+    return order
 
 # ============================================================================
 # ROUTE 10: Analytics et reporting
 # ============================================================================
 @app.get("/analytics", response_model=Analytics, tags=["Analytics"])
-def get_analytics(period: str = Query("today", pattern="^(today|week|month|year)$"), token: str = Depends(oauth2_scheme)):
-    """Récupérer les analytics de vente"""
+async def get_analytics(
+    period: str = Query("today", pattern="^(today|week|month|year|daily|weekly|monthly|yearly|all)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    token: str = Depends(oauth2_scheme)
+):
+    """Récupérer les analytics de vente sur une période ou une plage de dates"""
     current_user = get_current_user(token)
-    
-    # Calculs simulés basés sur les données
-    total_orders = len(orders_db)
-    total_revenue = sum(order.total_amount for order in orders_db)
-    average_order_value = total_revenue / total_orders if total_orders > 0 else 0
-    
-    # Top produits (simulation)
-    product_sales = {}
-    for order in orders_db:
-        for item in order.items:
-            if item.product_name not in product_sales:
-                product_sales[item.product_name] = 0
-            product_sales[item.product_name] += item.quantity
-    
-    top_products = [
-        {"name": name, "quantity_sold": qty} 
-        for name, qty in sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:5]
-    ]
-    
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+
+    key = (await order_store.current_version(), await client_store.current_version(), period, start_date, end_date)
+    analytics = response_cache.get("/analytics", key)
+    if analytics is None:
+        analytics = await compute_analytics(period, start_date, end_date)
+        response_cache.set("/analytics", key, analytics)
+    return analytics
+
+async def period_summary(start: Optional[datetime], end: Optional[datetime]):
+    if SHARED_ANALYTICS:
+        return await order_store.summarize(start, end, analytics_aggregates.top_k)
+    # Sans borne, les agrégats globaux répondent directement en O(k)
+    if start is None and end is None:
+        return analytics_aggregates
+    return analytics_buckets.summarize(start, end)
+
+async def compute_analytics(period: str, start_date: Optional[date], end_date: Optional[date]) -> Analytics:
+    start, end = resolve_period(period, start_date, end_date)
+    summary = await period_summary(start, end)
     return Analytics(
         period=period,
-        total_orders=total_orders,
-        total_revenue=total_revenue,
-        average_order_value=average_order_value,
-        top_products=top_products,
-        client_count=len(clients_db)
+        total_orders=summary.total_orders,
+        total_revenue=summary.total_revenue,
+        average_order_value=summary.average_order_value,
+        top_products=summary.top_products(),
+        client_count=await client_store.count(),
+        period_start=start,
+        period_end=end
     )
 
+@app.get("/analytics/breakdown", response_model=List[AnalyticsBucket], tags=["Analytics"])
+async def get_analytics_breakdown(
+    period: str = Query("week", pattern="^(today|week|month|year|daily|weekly|monthly|yearly|all)$"),
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    token: str = Depends(oauth2_scheme)
+):
+    """Commandes et chiffre d'affaires par heure ou par jour sur une période"""
+    current_user = get_current_user(token)
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+
+    key = (await order_store.current_version(), "breakdown", period, granularity, start_date, end_date)
+    buckets = response_cache.get("/analytics", key)
+    if buckets is None:
+        start, end = resolve_period(period, start_date, end_date)
+        if SHARED_ANALYTICS:
+            buckets = await order_store.breakdown(start, end, granularity)
+        else:
+            buckets = analytics_columns.breakdown(start, end, granularity)
+        response_cache.set("/analytics", key, buckets)
+    return buckets
+
+@app.get("/analytics/consistency", tags=["Analytics"])
+async def check_analytics_consistency(token: str = Depends(oauth2_scheme)):
+    """Comparer les agrégats incrémentaux avec une reconstruction complète"""
+    current_user = get_current_user(token)
+    served = await period_summary(None, None)
+    rebuilt = AnalyticsAggregates.from_orders(await order_store.all(), analytics_aggregates.top_k)
+    return {
+        "consistent": rebuilt.matches(served),
+        "incremental": {
+            "total_orders": served.total_orders,
+            "total_revenue": round(served.total_revenue, 2)
+        },
+        "rebuilt": {
+            "total_orders": rebuilt.total_orders,
+            "total_revenue": round(rebuilt.total_revenue, 2)
+        }
+    }
+
 # ============================================================================
 # ROUTE BONUS: Métriques Prometheus
 # ============================================================================
 @app.get("/metrics", tags=["Monitoring"])
-def metrics():
-    """Métriques Prometheus pour monitoring"""
-    return generate_latest()
+async def metrics():
+    """Métriques Prometheus (format d'exposition texte, agrégées sur tous les workers)"""
+    return Response(content=exposition.render(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/metrics/latency", tags=["Monitoring"])
+async def latency_percentiles():
+    """Percentiles de latence côté serveur par route (ms), depuis le démarrage ou le dernier reset (tous workers)"""
+    return latency_quantiles.summary()
+
+@app.delete("/metrics/latency", tags=["Monitoring"])
+async def reset_latency_percentiles():
+    """Remettre les percentiles à zéro au lancement d'un test de charge (tous workers)"""
+    latency_quantiles.reset()
+    return {"reset": True}
 
 # ============================================================================
 # DÉMARRAGE DE L'APPLICATION
 # ============================================================================
+def prepare_multiprocess_metrics():
+    """Répertoire des métriques multiprocess, vidé des fichiers d'une exécution précédente"""
+    import tempfile
+    path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="buyyourkawa-metrics-"))
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db") or name.startswith(LatencyQuantiles.SNAPSHOT_PREFIX):
+            os.remove(os.path.join(path, name))
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if API_WORKERS > 1:
+        if STORAGE_BACKEND == "memory":
+            raise SystemExit("API_WORKERS > 1 requires a shared backend: set STORAGE_BACKEND=sqlite")
+        prepare_multiprocess_metrics()
+        # Relance via la CLI uvicorn : ce module, déjà exécuté comme __main__, serait sinon
+        # ré-importé par chaque worker (métriques enregistrées deux fois).
+        # --app-dir : main reste importable quel que soit le répertoire de lancement
+        import sys
+        os.execve(sys.executable, [sys.executable, "-m", "uvicorn", "main:app",
+                                   "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+                                   "--host", API_HOST, "--port", str(API_PORT),
+                                   "--workers", str(API_WORKERS)], os.environ)
+    else:
+        uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -0,0 +1,199 @@
+# metrics.py
+"""
+Middleware ASGI d'instrumentation Prometheus et exposition des métriques
+Les requêtes sont étiquetées par modèle de route (/clients/{client_id}) et non
+par chemin, ce qui borne la cardinalité des séries quelle que soit la durée du
+test. Les enfants .labels() sont mis en cache : un seul accès dict par requête.
+Le point d'exposition est exclu des mesures et réutilise sa dernière sortie
+tant qu'aucune métrique n'a changé
+"""
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest, multiprocess, start_http_server
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from quantiles import LatencyQuantiles
+
+# Étiquette commune des requêtes qui ne correspondent à aucune route (404, scans)
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Buckets fins sous les cibles SLA, pour les endpoints servis depuis la mémoire
+FAST_BUCKETS_MS = (5, 10, 25, 50, 100)
+# Seuils d'alerte de run_load_tests.py
+REPORT_THRESHOLDS_MS = (200, 500)
+
+
+def sla_targets_ms(document) -> List[float]:
+    """Cibles de temps de réponse (clés *response_time*_ms) d'un fichier de scénarios"""
+    targets = []
+    if isinstance(document, dict):
+        for key, value in document.items():
+            if isinstance(value, (dict, list)):
+                targets.extend(sla_targets_ms(value))
+            elif "response_time" in key and key.endswith("_ms") and isinstance(value, (int, float)):
+                targets.append(float(value))
+    elif isinstance(document, list):
+        for value in document:
+            targets.extend(sla_targets_ms(value))
+    return targets
+
+
+def sla_buckets(paths: Iterable[str], override: str = "") -> Tuple[float, ...]:
+    """
+    Buckets (secondes) de l'histogramme de latence : valeurs explicites si override
+    est fourni ("0.05,0.2,0.5"), sinon cibles SLA des fichiers de scénarios
+    """
+    if override:
+        return tuple(sorted({float(value) for value in override.split(",") if value.strip()}))
+    targets = set(FAST_BUCKETS_MS) | set(REPORT_THRESHOLDS_MS)
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as scenarios:
+                targets.update(sla_targets_ms(json.load(scenarios)))
+        except (OSError, ValueError):
+            logging.getLogger(__name__).warning("SLA file %s ignored", path)
+    return tuple(sorted(target / 1000 for target in targets))
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Modèle de la route résolue par le routeur FastAPI (scope["route"])
+    Les routes Starlette (/docs, /openapi.json, /redoc) ne le renseignent pas :
+    elles sont retrouvées parmi les routes de l'application ; UNMATCHED_ROUTE
+    est réservé aux vraies 404
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    app = scope.get("app")
+    for candidate in getattr(app, "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match != Match.NONE:
+            return getattr(candidate, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Compteur par (méthode, route, classe de statut), latence par (méthode, route)
+    et compteurs succès/échec ; 304 Not Modified compte comme un succès
+    """
+
+    def __init__(self, app: ASGIApp, count, latency, success, failure,
+                 excluded_paths: Collection[str] = (), on_request: Optional[Callable[[], None]] = None,
+                 quantiles: Optional[LatencyQuantiles] = None):
+        self.app = app
+        self.count = count
+        self.latency = latency
+        self.success = success
+        self.failure = failure
+        # Chemins non mesurés (scrapes Prometheus) : ils ne faussent pas les latences
+        self.excluded_paths = frozenset(excluded_paths)
+        self._on_request = on_request
+        self.quantiles = quantiles
+        self._children: Dict[Tuple[str, str, int], tuple] = {}
+
+    def _metrics_for(self, method: str, endpoint: str, status: int) -> tuple:
+        status_class = status // 100
+        key = (method, endpoint, status_class)
+        children = self._children.get(key)
+        if children is None:
+            outcome = self.success if 200 <= status < 400 else self.failure
+            children = self._children[key] = (
+                self.count.labels(method, endpoint, f"{status_class}xx"),
+                self.latency.labels(method, endpoint),
+                outcome.labels(method, endpoint),
+                self.quantiles.sketch(method, endpoint) if self.quantiles else None
+            )
+        return children
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Fin de la réponse complète, y compris pour les réponses en flux
+            elapsed = time.perf_counter() - start
+            count, latency, outcome, sketch = self._metrics_for(scope["method"], route_template(scope), status)
+            count.inc()
+            latency.observe(elapsed)
+            outcome.inc()
+            if sketch is not None:
+                # sync d'abord : une remise à zéro d'un autre worker ne doit pas effacer cette valeur
+                self.quantiles.sync()
+                sketch.add(elapsed)
+            if self._on_request:
+                self._on_request()
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registre du processus, ou collecte des fichiers de tous les workers en mode multiprocess"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+class ExpositionCache:
+    """
+    Sortie de generate_latest réutilisée d'un scrape à l'autre tant que
+    mark_changed() n'a pas été appelé, et au plus max_age secondes : les
+    collecteurs process_* et python_gc_* changent aussi sans requête mesurée.
+    Sans effet en mode multiprocess, où les autres workers modifient les
+    métriques sans passer par ce processus
+    """
+
+    def __init__(self, registry: CollectorRegistry, enabled: bool = True, max_age: float = 1.0):
+        self.registry = registry
+        self.enabled = enabled
+        self.max_age = max_age
+        self._generation = 0
+        # (génération, instant du rendu, sortie)
+        self._rendered: Tuple[int, float, bytes] = (-1, 0.0, b"")
+        self._lock = Lock()
+
+    def mark_changed(self) -> None:
+        self._generation += 1
+
+    def render(self) -> bytes:
+        if not self.enabled:
+            return generate_latest(self.registry)
+        with self._lock:
+            generation, now = self._generation, time.monotonic()
+            rendered_generation, rendered_at, output = self._rendered
+            if rendered_generation != generation or now - rendered_at >= self.max_age:
+                output = generate_latest(self.registry)
+                self._rendered = (generation, now, output)
+            return output
+
+
+def start_metrics_server(port: int, registry: CollectorRegistry):
+    """
+    Exposition sur un port dédié, hors de la boucle d'événements de l'API
+    Avec plusieurs workers, le premier qui obtient le port le sert pour tous
+    """
+    try:
+        return start_http_server(port, registry=registry)
+    except OSError:
+        logging.getLogger(__name__).info("Metrics port %s already served by another worker", port)
+        return None
@@ -1,11 +1,30 @@
 # models.py
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import AfterValidator, BaseModel, Field, WithJsonSchema
 from pydantic import field_validator
-from typing import Optional, List
+from typing import Annotated, Optional, List
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
+from pydantic.networks import validate_email
 import re
 
+# Motifs compilés une seule fois au chargement du module (validés à chaque requête)
+ZIP_PATTERN = re.compile(r'^\d{5}$')
+PHONE_PATTERN = re.compile(r'^\+?33[1-9]\d{8}$')
+
+
+@lru_cache(maxsize=4096)
+def _normalized_email(value: str) -> str:
+    # La validation RFC 5322 + IDNA du domaine domine le coût d'un Client :
+    # une adresse déjà vue (mise à jour, réimport, tests de charge) n'est validée qu'une fois
+    return validate_email(value)[1]
+
+
+# Équivalent d'EmailStr dont le résultat de validation est mis en cache par adresse
+CachedEmailStr = Annotated[str, AfterValidator(_normalized_email),
+                           WithJsonSchema({"type": "string", "format": "email"})]
+
+
 class OrderStatus(str, Enum):
     PENDING = "pending"
     CONFIRMED = "confirmed"
@@ -31,14 +50,14 @@ class Address(BaseModel):
     @field_validator('zip')
     def validate_zip(cls, v):
         # Validation pour les codes postaux français (5 chiffres)
-        if not re.match(r'^\d{5}$', v):
+        if not ZIP_PATTERN.match(v):
             raise ValueError('Code postal invalide. Doit contenir 5 chiffres.')
         return v
 
 class Client(BaseModel):
     id: Optional[str] = None
     name: str = Field(..., min_length=2, max_length=100, description="Nom complet du client")
-    email: EmailStr = Field(..., description="Email valide selon RFC 5322")
+    email: CachedEmailStr = Field(..., description="Email valide selon RFC 5322")
     phone: str = Field(..., min_length=10, max_length=20, description="Numéro de téléphone")
     address: Address
     loyalty_points: int = Field(default=0, ge=0, description="Points de fidélité")
@@ -49,7 +68,7 @@ class Client(BaseModel):
     @field_validator('phone')
     def validate_phone(cls, v):
         # Validation pour les numéros de téléphone français
-        if not re.match(r'^\+?33[1-9]\d{8}$', v):
+        if not PHONE_PATTERN.match(v):
             raise ValueError('Numéro de téléphone invalide. Format : +33XYYYYYYY')
         return v
 
@@ -76,6 +95,19 @@ class OrderItem(BaseModel):
     unit_price: float = Field(..., gt=0, description="Prix unitaire")
     total_price: float = Field(..., gt=0, description="Prix total de la ligne")
 
+class OrderLine(BaseModel):
+    product_id: str = Field(..., description="ID du produit")
+    quantity: int = Field(..., gt=0, le=20, description="Quantité commandée")
+
+class OrderCreate(BaseModel):
+    """
+    Commande telle que saisie par le client : noms, prix et totaux sont fixés par
+    le serveur à partir du catalogue (les champs en trop d'un ancien payload sont ignorés)
+    """
+    client_id: str = Field(..., description="ID du client")
+    items: List[OrderLine] = Field(..., min_length=1, description="Produits et quantités commandés")
+    notes: Optional[str] = Field(None, max_length=500, description="Notes spéciales")
+
 class Order(BaseModel):
     id: Optional[str] = None
     client_id: str = Field(..., description="ID du client")
@@ -91,6 +123,29 @@ class Order(BaseModel):
     def validate_total_amount(cls, v):
         return round(v, 2)
 
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus = Field(..., description="Nouveau statut (voir lifecycle.TRANSITIONS)")
+
+class TokenRefreshRequest(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token obtenu via /token")
+
+class ClientPage(BaseModel):
+    items: List[Client] = Field(..., description="Clients de la page")
+    next_cursor: Optional[str] = Field(None, description="Curseur de la page suivante")
+
+class OrderPage(BaseModel):
+    items: List[Order] = Field(..., description="Commandes de la page")
+    next_cursor: Optional[str] = Field(None, description="Curseur de la page suivante")
+
+class AnalyticsBucket(BaseModel):
+    period_start: datetime = Field(..., description="Début de l'heure ou du jour")
+    total_orders: int = Field(..., description="Nombre de commandes")
+    total_revenue: float = Field(..., description="Chiffre d'affaires")
+
+class BulkCreateResult(BaseModel):
+    created: int = Field(..., description="Nombre d'éléments créés")
+    ids: List[str] = Field(..., description="Identifiants attribués, dans l'ordre du lot")
+
 class Analytics(BaseModel):
     period: str = Field(..., description="Période d'analyse")
     total_orders: int = Field(..., ge=0, description="Nombre total de commandes")
@@ -98,6 +153,8 @@ class Analytics(BaseModel):
     average_order_value: float = Field(..., ge=0, description="Panier moyen")
     top_products: List[dict] = Field(..., description="Produits les plus vendus")
     client_count: int = Field(..., ge=0, description="Nombre de clients")
+    period_start: Optional[datetime] = Field(None, description="Début de la période analysée")
+    period_end: Optional[datetime] = Field(None, description="Fin de la période analysée")
     generated_at: datetime = Field(default_factory=datetime.now, description="Date de génération")
 
 class Inventory(BaseModel):
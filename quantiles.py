@@ -0,0 +1,219 @@
+# quantiles.py
+"""
+Estimation en flux des quantiles de latence (sketch à erreur relative bornée)
+Chaque valeur est rangée dans un bucket logarithmique de largeur relative
+fixe (principe de DDSketch) : insertion O(1), mémoire bornée par la dynamique
+des valeurs, et p50/p95/p99 à ±1 % près, directement comparables aux
+percentiles calculés côté client par Locust.
+Avec plusieurs workers, chaque processus publie ses sketches dans le répertoire
+multiprocess (au plus une fois par seconde) ; la lecture fusionne ceux de tous
+les workers et la remise à zéro passe par un numéro de génération partagé
+"""
+import json
+import math
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Sketch de quantiles pour des valeurs positives (secondes)"""
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins: Dict[int, int] = {}
+        self._zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self._zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._bins[key] = self._bins.get(key, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self._bins):
+            seen += self._bins[key]
+            if rank < seen:
+                # Milieu du bucket (en relatif) : erreur <= relative_accuracy
+                return min(2 * self._gamma ** key / (self._gamma + 1), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Ajouter les valeurs d'un autre sketch de même précision (buckets identiques)"""
+        for key, count in other._bins.items():
+            self._bins[key] = self._bins.get(key, 0) + count
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        return {"bins": self._bins, "zero": self._zero_count, "count": self.count,
+                "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict, relative_accuracy: float = 0.01) -> "QuantileSketch":
+        sketch = cls(relative_accuracy)
+        sketch._bins = {int(key): count for key, count in data["bins"].items()}
+        sketch._zero_count = data["zero"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.max = data["max"]
+        return sketch
+
+
+def _write_json(path: str, data) -> None:
+    # Écriture atomique : un lecteur ne voit jamais de fichier à moitié écrit
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as output:
+        json.dump(data, output, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+class LatencyQuantiles:
+    """
+    Sketches par (méthode, route), alimentés par le middleware de métriques
+    shared_dir (répertoire multiprocess) active la fusion entre workers
+    """
+
+    SNAPSHOT_PREFIX = "latency_"
+    GENERATION_FILE = "latency_generation.json"
+
+    def __init__(self, relative_accuracy: float = 0.01, quantiles: Iterable[float] = QUANTILES,
+                 shared_dir: Optional[str] = None, sync_interval: float = 1.0,
+                 worker_id: Optional[str] = None):
+        self.relative_accuracy = relative_accuracy
+        self.quantiles = tuple(quantiles)
+        self.shared_dir = shared_dir
+        self.sync_interval = sync_interval
+        # Identifiant du fichier publié ; le pid par défaut, lu à l'écriture (après fork)
+        self.worker_id = worker_id
+        self._sketches: Dict[Tuple[str, str], QuantileSketch] = {}
+        self._generation = 0
+        self._generation_version: Optional[Tuple[int, int]] = None
+        self._next_sync = 0.0
+
+    def sketch(self, method: str, endpoint: str) -> QuantileSketch:
+        key = (method, endpoint)
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = QuantileSketch(self.relative_accuracy)
+        return sketch
+
+    def _clear(self) -> None:
+        # Les sketches gardent leur identité (référencés par le middleware)
+        for sketch in self._sketches.values():
+            sketch.__init__(sketch.relative_accuracy, sketch.min_value)
+
+    def reset(self) -> None:
+        """Remettre les sketches à zéro (début d'un test de charge), dans tous les workers"""
+        self._clear()
+        if self.shared_dir:
+            self._generation = self._shared_generation() + 1
+            _write_json(os.path.join(self.shared_dir, self.GENERATION_FILE), self._generation)
+            self.sync(force=True)
+
+    def _shared_generation(self) -> int:
+        return _read_json(os.path.join(self.shared_dir, self.GENERATION_FILE)) or 0
+
+    def _apply_shared_reset(self) -> None:
+        # Un stat par requête (~1 µs) : la remise à zéro d'un autre worker est vue avant
+        # d'enregistrer la requête suivante, sans perdre les valeurs mesurées après elle
+        path = os.path.join(self.shared_dir, self.GENERATION_FILE)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        # os.replace crée un nouvel inode à chaque écriture : pas de dépendance à la résolution de mtime
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._generation_version:
+            return
+        self._generation_version = version
+        generation = _read_json(path) or 0
+        if generation > self._generation:
+            self._clear()
+            self._generation = generation
+
+    def sync(self, force: bool = False) -> None:
+        """
+        Appliquer une remise à zéro demandée par un autre worker, puis publier les
+        sketches du processus (au plus une fois par sync_interval)
+        """
+        if not self.shared_dir:
+            return
+        self._apply_shared_reset()
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        _write_json(os.path.join(self.shared_dir, f"{self.SNAPSHOT_PREFIX}{self.worker_id or os.getpid()}.json"), {
+            "generation": self._generation,
+            "sketches": {f"{method} {endpoint}": sketch.to_dict()
+                         for (method, endpoint), sketch in self._sketches.items() if sketch.count}
+        })
+
+    def _merged(self) -> Dict[Tuple[str, str], QuantileSketch]:
+        """Sketches de tous les workers de la génération courante"""
+        self.sync(force=True)
+        merged: Dict[Tuple[str, str], QuantileSketch] = {}
+        for name in os.listdir(self.shared_dir):
+            if not name.startswith(self.SNAPSHOT_PREFIX) or name == self.GENERATION_FILE \
+                    or not name.endswith(".json"):
+                continue
+            snapshot = _read_json(os.path.join(self.shared_dir, name))
+            # Un worker qui n'a pas encore vu la dernière remise à zéro est ignoré
+            if not snapshot or snapshot["generation"] != self._generation:
+                continue
+            for label, data in snapshot["sketches"].items():
+                method, endpoint = label.split(" ", 1)
+                sketch = QuantileSketch.from_dict(data, self.relative_accuracy)
+                if (method, endpoint) in merged:
+                    merged[(method, endpoint)].merge(sketch)
+                else:
+                    merged[(method, endpoint)] = sketch
+        return merged
+
+    def summary(self) -> Dict[str, dict]:
+        """Percentiles en millisecondes par "MÉTHODE route", comme les rapports Locust"""
+        sketches = self._merged() if self.shared_dir else self._sketches
+        result = {}
+        for (method, endpoint), sketch in sorted(sketches.items()):
+            if not sketch.count:
+                continue
+            entry = {"count": sketch.count, "avg_ms": round(sketch.mean * 1000, 2)}
+            for q in self.quantiles:
+                entry[f"p{q * 100:g}_ms"] = round(sketch.quantile(q) * 1000, 2)
+            entry["max_ms"] = round(sketch.max * 1000, 2)
+            result[f"{method} {endpoint}"] = entry
+        return result
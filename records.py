@@ -0,0 +1,110 @@
+# records.py
+"""
+Représentation compacte des entités stockées en mémoire
+Les repositories conservent des enregistrements à __slots__ (pas de __dict__
+ni de métadonnées de validation par instance) ; les chaînes très répétées
+(noms de produits, villes, clients des commandes) sont internées et les statuts
+et catégories sont les membres d'Enum partagés. Les modèles Pydantic ne sont
+reconstruits (sans revalidation) qu'à la frontière de l'API
+"""
+import sys
+from typing import Optional
+
+from models import Address, Client, Order, OrderItem, OrderStatus, Product, ProductCategory
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+
+class AddressRecord(_Record):
+    __slots__ = ("street", "city", "zip", "country")
+
+
+class ClientRecord(_Record):
+    __slots__ = ("id", "name", "email", "phone", "address", "loyalty_points", "is_active",
+                 "created_at", "updated_at")
+
+
+class ProductRecord(_Record):
+    __slots__ = ("id", "name", "description", "price", "category", "is_available", "stock_quantity",
+                 "created_at", "updated_at")
+
+
+class OrderItemRecord(_Record):
+    __slots__ = ("product_id", "product_name", "quantity", "unit_price", "total_price")
+
+
+class OrderRecord(_Record):
+    __slots__ = ("id", "client_id", "client_name", "items", "total_amount", "status", "notes",
+                 "created_at", "updated_at")
+
+
+def client_to_record(client: Client) -> ClientRecord:
+    address = client.address
+    return ClientRecord(
+        client.id, client.name, client.email, client.phone,
+        AddressRecord(address.street, _intern(address.city), _intern(address.zip), _intern(address.country)),
+        client.loyalty_points, client.is_active, client.created_at, client.updated_at
+    )
+
+
+def client_from_record(record: ClientRecord) -> Client:
+    address = record.address
+    return Client.model_construct(
+        id=record.id, name=record.name, email=record.email, phone=record.phone,
+        address=Address.model_construct(street=address.street, city=address.city, zip=address.zip,
+                                        country=address.country),
+        loyalty_points=record.loyalty_points, is_active=record.is_active,
+        created_at=record.created_at, updated_at=record.updated_at
+    )
+
+
+def product_to_record(product: Product) -> ProductRecord:
+    return ProductRecord(
+        product.id, _intern(product.name), product.description, product.price,
+        ProductCategory(product.category), product.is_available, product.stock_quantity,
+        product.created_at, product.updated_at
+    )
+
+
+def product_from_record(record: ProductRecord) -> Product:
+    return Product.model_construct(
+        id=record.id, name=record.name, description=record.description, price=record.price,
+        category=record.category, is_available=record.is_available, stock_quantity=record.stock_quantity,
+        created_at=record.created_at, updated_at=record.updated_at
+    )
+
+
+def order_to_record(order: Order) -> OrderRecord:
+    items = tuple(
+        OrderItemRecord(_intern(item.product_id), _intern(item.product_name), item.quantity,
+                        item.unit_price, item.total_price)
+        for item in order.items
+    )
+    return OrderRecord(
+        order.id, _intern(order.client_id), _intern(order.client_name), items, order.total_amount,
+        OrderStatus(order.status), order.notes, order.created_at, order.updated_at
+    )
+
+
+def order_from_record(record: OrderRecord) -> Order:
+    return Order.model_construct(
+        id=record.id, client_id=record.client_id, client_name=record.client_name,
+        items=[
+            OrderItem.model_construct(product_id=item.product_id, product_name=item.product_name,
+                                      quantity=item.quantity, unit_price=item.unit_price,
+                                      total_price=item.total_price)
+            for item in record.items
+        ],
+        total_amount=record.total_amount, status=record.status, notes=record.notes,
+        created_at=record.created_at, updated_at=record.updated_at
+    )
@@ -0,0 +1,386 @@
+# repositories.py
+"""
+Couche repository en mémoire pour l'API BuyYourKawa
+Les entités sont indexées par identifiant (recherche O(1)) tout en
+conservant l'ordre d'insertion pour la pagination. Clients, produits et
+commandes sont stockés sous forme d'enregistrements compacts (records.py)
+et redeviennent des modèles Pydantic à la lecture
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, insort
+from contextlib import ExitStack
+from itertools import islice
+from threading import Lock
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from lifecycle import check_transition, order_quantities
+from models import OrderStatus
+from records import (
+    client_from_record, client_to_record, order_from_record, order_to_record,
+    product_from_record, product_to_record
+)
+
+T = TypeVar("T")
+
+
+class ReservationError(Exception):
+    """Réservation de stock impossible"""
+
+
+class ProductNotFound(ReservationError):
+    def __init__(self, product_id: str):
+        super().__init__(f"Product {product_id} not found")
+        self.product_id = product_id
+
+
+class InsufficientStock(ReservationError):
+    def __init__(self, product):
+        super().__init__(f"Insufficient stock for {product.name}")
+        self.product = product
+
+
+def encode_cursor(position: int) -> str:
+    """Curseur opaque désignant la première position d'insertion de la page"""
+    return urlsafe_b64encode(f"p:{position}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Position encodée dans un curseur, ValueError si le curseur est invalide"""
+    if not cursor:
+        return 0
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    prefix, _, position = raw.partition(":")
+    if prefix != "p" or not position.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(position)
+
+
+class InMemoryRepository(Generic[T]):
+    """Stockage indexé par id qui conserve l'ordre d'insertion"""
+
+    # Appels directs sur la boucle d'événements (voir storage.AsyncRepository)
+    blocking = False
+
+    def __init__(self):
+        self._items: Dict[str, T] = {}
+        # Ordre d'insertion des ids, utilisé pour le découpage en pages
+        self._ids: List[str] = []
+        # Position de chaque id dans self._ids
+        self._positions: Dict[str, int] = {}
+        # Version de la collection, incrémentée à chaque écriture (ETag)
+        self.version = 0
+
+    # Conversion entité <-> forme stockée (identité par défaut)
+    @staticmethod
+    def _to_record(entity):
+        return entity
+
+    @staticmethod
+    def _to_model(record) -> T:
+        return record
+
+    def add(self, entity: T) -> T:
+        if entity.id in self._items:
+            raise ValueError(f"Duplicate id {entity.id}")
+        self._items[entity.id] = self._to_record(entity)
+        self._positions[entity.id] = len(self._ids)
+        self._ids.append(entity.id)
+        self.version += 1
+        return entity
+
+    def touch(self) -> None:
+        """Signaler une modification en place d'une entité de la collection"""
+        self.version += 1
+
+    def add_many(self, entities: Iterable[T]) -> List[T]:
+        """Insérer un lot en entier ou pas du tout (ids vérifiés avant toute écriture)"""
+        entities = list(entities)
+        ids = {entity.id for entity in entities}
+        if len(ids) != len(entities) or any(entity_id in self._items for entity_id in ids):
+            raise ValueError("Duplicate id in batch")
+        for entity in entities:
+            self.add(entity)
+        return entities
+
+    def extend(self, entities: Iterable[T]) -> None:
+        for entity in entities:
+            self.add(entity)
+
+    def get(self, entity_id: str) -> Optional[T]:
+        record = self._items.get(entity_id)
+        return self._to_model(record) if record is not None else None
+
+    def update(self, entity: T) -> T:
+        """Enregistrer une entité modifiée (déjà présente)"""
+        self._items[entity.id] = self._to_record(entity)
+        self.touch()
+        return entity
+
+    def count(self) -> int:
+        return len(self._items)
+
+    def all(self) -> List[T]:
+        return [self._to_model(record) for record in self._items.values()]
+
+    def page(self, skip: int = 0, limit: int = 100) -> List[T]:
+        return [self._to_model(self._items[entity_id]) for entity_id in self._ids[skip:skip + limit]]
+
+    def page_after(self, start: int = 0, limit: int = 100) -> Tuple[List[T], Optional[int]]:
+        """Page par clé (position d'insertion) et position de départ de la page suivante"""
+        end = start + limit
+        items = [self._to_model(self._items[entity_id]) for entity_id in self._ids[start:end]]
+        return items, end if end < len(self._ids) else None
+
+    def page_from_offset(self, skip: int = 0, limit: int = 100) -> Tuple[List[T], Optional[int]]:
+        """Page par décalage (paramètre skip) ; en mémoire la position est le décalage"""
+        return self.page_after(skip, limit)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[T]:
+        return (self._to_model(record) for record in self._items.values())
+
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self._items
+
+    def __getitem__(self, index):
+        # Compatibilité avec l'ancien accès par liste (clients_db[skip:skip + limit])
+        if isinstance(index, slice):
+            return [self._to_model(self._items[entity_id]) for entity_id in self._ids[index]]
+        return self._to_model(self._items[self._ids[index]])
+
+
+class ClientRepository(InMemoryRepository):
+    """Clients indexés par id"""
+
+    _to_record = staticmethod(client_to_record)
+    _to_model = staticmethod(client_from_record)
+
+
+class ProductRepository(InMemoryRepository):
+    """Produits indexés par id, avec un verrou par produit pour les réservations de stock"""
+
+    _to_record = staticmethod(product_to_record)
+    _to_model = staticmethod(product_from_record)
+
+    def __init__(self):
+        super().__init__()
+        self._locks: Dict[str, Lock] = {}
+
+    def add(self, product):
+        super().add(product)
+        self._locks[product.id] = Lock()
+        return product
+
+    def seed(self, products: Iterable) -> None:
+        """Insérer le catalogue initial, sans toucher aux produits déjà présents"""
+        self.extend(product for product in products if product.id not in self._items)
+
+    def filter(self, category: Optional[str] = None, available_only: bool = False) -> List:
+        """Produits filtrés par catégorie et/ou disponibilité"""
+        products = self._items.values()
+        if category:
+            products = [p for p in products if p.category == category]
+        if available_only:
+            products = [p for p in products if p.is_available and p.stock_quantity > 0]
+        return [self._to_model(p) for p in products]
+
+    def reserve(self, quantities: Dict[str, int]) -> List:
+        """
+        Vérifier et décrémenter les stocks en une seule passe, de façon atomique
+        quantities associe chaque product_id à la quantité demandée (dans l'ordre des lignes).
+        Les verrous sont pris dans l'ordre des ids pour éviter les interblocages ;
+        deux commandes sur des produits différents ne se bloquent pas
+        """
+        products = []
+        for product_id in quantities:
+            product = self._items.get(product_id)
+            if product is None:
+                raise ProductNotFound(product_id)
+            products.append(product)
+
+        with ExitStack() as stack:
+            for product_id in sorted(quantities):
+                stack.enter_context(self._locks[product_id])
+            for product in products:
+                if product.stock_quantity < quantities[product.id]:
+                    raise InsufficientStock(product)
+            for product in products:
+                product.stock_quantity -= quantities[product.id]
+            reserved = [self._to_model(product) for product in products]
+        self.touch()
+        return reserved
+
+    def release(self, quantities: Dict[str, int]) -> None:
+        """Rendre des quantités réservées (produits disparus ignorés)"""
+        with ExitStack() as stack:
+            for product_id in sorted(quantities):
+                if product_id in self._locks:
+                    stack.enter_context(self._locks[product_id])
+            for product_id, quantity in quantities.items():
+                product = self._items.get(product_id)
+                if product is not None:
+                    product.stock_quantity += quantity
+        self.touch()
+
+
+class SortedPositions:
+    """
+    Positions d'insertion triées, découpées en blocs d'au plus 2 * BLOCK éléments
+    Ajout et retrait en O(log n + BLOCK) quelle que soit la position (tête de file
+    comprise), plus petite position en O(1) et parcours trié à partir d'une position
+    """
+
+    BLOCK = 512
+
+    def __init__(self):
+        self._blocks: List[List[int]] = []
+        # Dernière position de chaque bloc, pour localiser un bloc par dichotomie
+        self._maxes: List[int] = []
+        self._len = 0
+
+    def add(self, position: int) -> None:
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([position])
+            self._maxes.append(position)
+            return
+        index = min(bisect_left(self._maxes, position), len(self._blocks) - 1)
+        block = self._blocks[index]
+        insort(block, position)
+        self._maxes[index] = block[-1]
+        if len(block) > 2 * self.BLOCK:
+            self._blocks[index:index + 1] = [block[:self.BLOCK], block[self.BLOCK:]]
+            self._maxes[index:index + 1] = [block[self.BLOCK - 1], block[-1]]
+
+    def remove(self, position: int) -> None:
+        index = bisect_left(self._maxes, position)
+        block = self._blocks[index]
+        del block[bisect_left(block, position)]
+        self._len -= 1
+        if block:
+            self._maxes[index] = block[-1]
+        else:
+            del self._blocks[index]
+            del self._maxes[index]
+
+    def first(self) -> Optional[int]:
+        return self._blocks[0][0] if self._blocks else None
+
+    def irange(self, start: int) -> Iterator[int]:
+        """Positions >= start, dans l'ordre"""
+        index = bisect_left(self._maxes, start)
+        if index == len(self._blocks):
+            return
+        block = self._blocks[index]
+        yield from block[bisect_left(block, start):]
+        for block in self._blocks[index + 1:]:
+            yield from block
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class OrderRepository(InMemoryRepository):
+    """
+    Commandes indexées par id, avec index secondaires par statut et par client
+    Chaque index secondaire contient les positions d'insertion triées, ce qui
+    permet de filtrer en temps proportionnel à la taille du résultat
+    """
+
+    _to_record = staticmethod(order_to_record)
+    _to_model = staticmethod(order_from_record)
+
+    def __init__(self, products: Optional[ProductRepository] = None):
+        super().__init__()
+        # Catalogue réapprovisionné par les annulations (voir transition)
+        self._products = products
+        # Files par statut : une commande en change à chaque transition
+        self._by_status: Dict[str, SortedPositions] = {}
+        # Index par client : positions croissantes, un append garde la liste triée
+        self._by_client: Dict[str, List[int]] = {}
+        self._transition_lock = Lock()
+
+    def add(self, order):
+        super().add(order)
+        position = self._positions[order.id]
+        self._by_status.setdefault(order.status, SortedPositions()).add(position)
+        self._by_client.setdefault(order.client_id, []).append(position)
+        return order
+
+    def _move(self, order_id: str, record, status) -> None:
+        # Retrait de l'ancienne file et insertion triée dans la nouvelle, en O(log n + BLOCK)
+        position = self._positions[order_id]
+        self._by_status[record.status].remove(position)
+        self._by_status.setdefault(status, SortedPositions()).add(position)
+        record.status = OrderStatus(status)
+
+    def transition(self, order_id: str, status, updated_at=None):
+        """
+        Changement de statut vérifié par la table des transitions (lifecycle.py)
+        Une annulation remet les articles en stock sous le même verrou.
+        Retourne la commande mise à jour, None si elle n'existe pas
+        """
+        with self._transition_lock:
+            record = self._items.get(order_id)
+            if record is None:
+                return None
+            check_transition(record.status, status)
+            self._move(order_id, record, status)
+            record.updated_at = updated_at
+            if record.status == OrderStatus.CANCELLED and self._products is not None:
+                self._products.release(order_quantities(record))
+        self.touch()
+        return self._to_model(record)
+
+    def next_with_status(self, status):
+        """Plus ancienne commande d'un statut (tête de la file) en O(1), None si la file est vide"""
+        positions = self._by_status.get(status)
+        position = positions.first() if positions is not None else None
+        if position is None:
+            return None
+        return self._to_model(self._items[self._ids[position]])
+
+    def find(self, status: Optional[str] = None, client_id: Optional[str] = None) -> List:
+        """Commandes filtrées par statut et/ou client, dans l'ordre de création"""
+        orders, _ = self.find_page(status, client_id, 0, len(self._ids))
+        return orders
+
+    def find_page(self, status: Optional[str] = None, client_id: Optional[str] = None,
+                  start: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        """
+        Page de commandes filtrées à partir de la position start
+        Retourne aussi la position de départ de la page suivante (None en fin de liste)
+        """
+        if status is None and client_id is None:
+            return self.page_after(start, limit)
+        no_orders = SortedPositions()
+        if status is None:
+            positions, matches = self._by_client.get(client_id, []), None
+        elif client_id is None:
+            positions, matches = self._by_status.get(status, no_orders), None
+        else:
+            # Intersection : on parcourt le plus petit des deux index
+            by_status = self._by_status.get(status, no_orders)
+            by_client = self._by_client.get(client_id, [])
+            if len(by_status) <= len(by_client):
+                positions, matches = by_status, lambda order: order.client_id == client_id
+            else:
+                positions, matches = by_client, lambda order: order.status == status
+
+        if isinstance(positions, SortedPositions):
+            candidates = positions.irange(start)
+        else:
+            candidates = islice(positions, bisect_left(positions, start), None)
+        orders = []
+        for position in candidates:
+            if len(orders) == limit:
+                return orders, position
+            order = self._items[self._ids[position]]
+            if matches is None or matches(order):
+                orders.append(self._to_model(order))
+        return orders, None
@@ -7,7 +7,9 @@ Génère les rapports HTML et CSV pour validation du plan d'actions correctives
 import subprocess
 import time
 import os
+import csv
 import json
+import argparse
 from datetime import datetime
 
 # Configuration des tests pour validation du plan d'actions
@@ -35,14 +37,53 @@ TEST_SCENARIOS = {
         "spawn_rate": 10,
         "duration": "300s",
         "description": "Test de stress - limite système (point de rupture)"
+    },
+    "token_storm": {
+        "users": 500,
+        "spawn_rate": 50,
+        "duration": "60s",
+        "locustfile": "locustfile_token.py",
+        "description": "Tempête de connexions - débit de /token isolé (spawn 50/s)"
     }
 }
 
-def run_locust_test(scenario_name, host="http://localhost:8000"):
+# Scénarios lancés par défaut (token_storm se lance explicitement)
+DEFAULT_SCENARIOS = ["validation", "normal", "peak", "stress"]
+
+# Scénarios réalistes (charge_estimation/locust_config_realistic.json)
+REALISTIC_CONFIG = os.path.join("charge_estimation", "locust_config_realistic.json")
+# Paliers 100 et 200 utilisateurs pour les benchmarks avant/après
+BENCHMARK_SCENARIOS = ["marketing_campaign", "stress_test"]
+
+def load_realistic_scenarios(path=REALISTIC_CONFIG):
+    """
+    Convertit les scénarios de locust_config_realistic.json au format TEST_SCENARIOS
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return {
+        name: {
+            "users": scenario["users_concurrent"],
+            "spawn_rate": scenario["spawn_rate"],
+            "duration": f"{scenario['duration_seconds']}s",
+            "locustfile": "locustfile_corrected.py",
+            "description": scenario["description"]
+        }
+        for name, scenario in config.get("test_scenarios", {}).items()
+    }
+
+TEST_SCENARIOS.update(load_realistic_scenarios())
+
+def run_locust_test(scenario_name, host="http://localhost:8000", duration=None):
     """
     Lance un test Locust pour un scénario donné et génère les rapports
+    duration remplace la durée du scénario (ex: "300s" pour un benchmark court)
     """
-    scenario = TEST_SCENARIOS[scenario_name]
+    scenario = dict(TEST_SCENARIOS[scenario_name])
+    if duration:
+        scenario["duration"] = duration
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # Noms des fichiers de sortie
@@ -52,7 +93,7 @@ def run_locust_test(scenario_name, host="http://localhost:8000"):
     # Commande Locust avec tous les paramètres nécessaires
     cmd = [
         "locust",
-        "-f", "locustfile.py",
+        "-f", scenario.get("locustfile", "locustfile.py"),
         "--host", host,
         "--users", str(scenario["users"]),
         "--spawn-rate", str(scenario["spawn_rate"]),
@@ -132,6 +173,25 @@ def check_api_health(host="http://localhost:8000"):
         print("Assurez-vous que l'API est démarrée: python -m uvicorn main:app --reload --port 8000")
         return False
 
+def server_percentiles(host="http://localhost:8000", reset=False):
+    """
+    Percentiles de latence mesurés côté serveur (GET /metrics/latency)
+    reset=True les remet à zéro avant un test pour couvrir la même fenêtre que Locust.
+    Avec plusieurs workers, chacun publie ses sketches toutes les secondes : on attend
+    une publication avant la lecture pour inclure la fin du test
+    """
+    try:
+        import requests
+        if reset:
+            requests.delete(f"{host}/metrics/latency", timeout=5)
+            return None
+        time.sleep(1.5)
+        response = requests.get(f"{host}/metrics/latency", timeout=5)
+        return response.json() if response.status_code == 200 else None
+    except Exception as e:
+        print(f"Percentiles serveur indisponibles: {e}")
+        return None
+
 def analyze_results(csv_file):
     """
     Analyse rapide des résultats CSV pour validation
@@ -141,30 +201,72 @@ def analyze_results(csv_file):
             return None
         
         with open(f"{csv_file}_stats.csv", 'r') as f:
-            lines = f.readlines()
-            if len(lines) < 2:
+            rows = list(csv.DictReader(f))
+            if not rows:
                 return None
             
-            # Parser la ligne des stats agrégées
-            stats_line = lines[-1]  # Dernière ligne = agrégé
-            parts = stats_line.split(',')
-            
-            if len(parts) >= 8:
-                return {
-                    "requests": int(parts[2]),
-                    "failures": int(parts[3]),
-                    "avg_response_time": float(parts[5]),
-                    "failure_rate": (int(parts[3]) / int(parts[2]) * 100) if int(parts[2]) > 0 else 0
-                }
+            # Dernière ligne = agrégé
+            stats = rows[-1]
+            requests_count = int(stats["Request Count"])
+            failures = int(stats["Failure Count"])
+            return {
+                "requests": requests_count,
+                "failures": failures,
+                "avg_response_time": float(stats["Average Response Time"]),
+                "p95_response_time": float(stats.get("95%") or 0),
+                "requests_per_second": float(stats.get("Requests/s") or 0),
+                "failure_rate": (failures / requests_count * 100) if requests_count > 0 else 0
+            }
     except Exception as e:
         print(f"Erreur lors de l'analyse des résultats: {e}")
     
     return None
 
-def main():
+def save_benchmark(label, test_results):
+    """
+    Sauvegarde les résultats d'une campagne pour comparaison avant/après
+    """
+    path = f"reporting/benchmark_{label}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "label": label,
+            "date": datetime.now().isoformat(),
+            "results": {name: result["analysis"] for name, result in test_results.items()}
+        }, f, indent=2)
+    print(f"Résultats du benchmark sauvegardés: {path}")
+    return path
+
+def compare_benchmarks(before_path, after_path):
+    """
+    Compare deux campagnes sauvegardées (ex: handlers sync vs async)
+    """
+    with open(before_path, 'r', encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+    
+    print(f"Comparaison: {before['label']} -> {after['label']}")
+    print(f"{'Scénario'.ljust(20)} {'Métrique'.ljust(12)} {before['label'].rjust(12)} {after['label'].rjust(12)} {'Écart'.rjust(9)}")
+    metrics = [
+        ("avg_response_time", "moyenne ms"),
+        ("p95_response_time", "p95 ms"),
+        ("requests_per_second", "req/s"),
+        ("failure_rate", "échecs %")
+    ]
+    for scenario, after_stats in after["results"].items():
+        before_stats = before["results"].get(scenario)
+        if not before_stats or not after_stats:
+            continue
+        for key, label in metrics:
+            old, new = before_stats.get(key, 0), after_stats.get(key, 0)
+            delta = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{scenario.ljust(20)} {label.ljust(12)} {old:12.1f} {new:12.1f} {delta.rjust(9)}")
+
+def main(scenario_names=None, duration=None, label=None):
     """
     Fonction principale - lance tous les tests et génère le rapport de validation
     """
+    scenario_names = scenario_names or DEFAULT_SCENARIOS
     print("BuyYourKawa API - Tests de Charge pour Plan d'Actions Correctives")
     print("=" * 70)
     print("Objectif: Valider les métriques avant/après optimisations")
@@ -181,27 +283,36 @@ def main():
     # Lancer les tests dans l'ordre croissant de charge
     test_results = {}
     
-    for scenario_name in ["validation", "normal", "peak", "stress"]:
+    for scenario_name in scenario_names:
         print(f"\n{'='*25} {scenario_name.upper()} {'='*25}")
         
-        success, html_report, csv_report = run_locust_test(scenario_name)
+        server_percentiles(reset=True)
+        success, html_report, csv_report = run_locust_test(scenario_name, duration=duration)
         
         # Analyser les résultats
         analysis = analyze_results(csv_report) if csv_report else None
+        server_latency = server_percentiles() if success else None
+        if server_latency:
+            with open(f"{csv_report}_server_latency.json", 'w', encoding='utf-8') as f:
+                json.dump(server_latency, f, indent=2)
         
         test_results[scenario_name] = {
             "success": success,
             "html_report": html_report,
             "csv_report": csv_report,
-            "analysis": analysis
+            "analysis": analysis,
+            "server_latency": server_latency
         }
         
         if success and analysis:
             print(f"Résultats rapides:")
             print(f"   Requêtes totales: {analysis['requests']}")
             print(f"   Échecs: {analysis['failures']} ({analysis['failure_rate']:.1f}%)")
-            print(f"   Temps moyen: {analysis['avg_response_time']:.0f}ms")
+            print(f"   Temps moyen: {analysis['avg_response_time']:.0f}ms | P95: {analysis['p95_response_time']:.0f}ms")
             print(f"   Rapport détaillé: {html_report}")
+            # Percentiles côté serveur, à comparer aux percentiles Locust (côté client)
+            for route, stats in (server_latency or {}).items():
+                print(f"   Serveur {route}: P50 {stats['p50_ms']:.0f}ms | P95 {stats['p95_ms']:.0f}ms | P99 {stats['p99_ms']:.0f}ms")
             
             # Validation des seuils
             if analysis['avg_response_time'] > 200:
@@ -210,7 +321,7 @@ def main():
                 print(f"   SEUIL DÉPASSÉ: Taux d'échec > 2%")
         
         # Pause entre les tests pour éviter la surcharge
-        if scenario_name != "stress":
+        if scenario_name != scenario_names[-1]:
             print("Pause de 15 secondes avant le test suivant...")
             time.sleep(15)
     
@@ -239,9 +350,30 @@ def main():
             elif analysis['failure_rate'] > 2:
                 print(f"             ATTENTION: Échecs > 2%")
     
+    if label:
+        save_benchmark(label, test_results)
+    
     print("\nTests terminés !")
     print("Consultez les rapports HTML détaillés dans le dossier 'reporting/'")
     print("Utilisez ces métriques pour valider l'efficacité du plan d'actions correctives")
 
 if __name__ == "__main__":
-    main()
+    # Exemples :
+    #   python run_load_tests.py token_storm
+    #   python run_load_tests.py --benchmark --duration 300s --label sync
+    #   python run_load_tests.py --compare reporting/benchmark_sync.json reporting/benchmark_async.json
+    parser = argparse.ArgumentParser(description="Tests de charge Locust BuyYourKawa")
+    parser.add_argument("scenarios", nargs="*", help=f"Scénarios à lancer ({', '.join(TEST_SCENARIOS)})")
+    parser.add_argument("--benchmark", action="store_true", help="Paliers 100 et 200 utilisateurs (marketing_campaign, stress_test)")
+    parser.add_argument("--duration", help="Durée imposée à chaque scénario (ex: 300s)")
+    parser.add_argument("--label", help="Sauvegarde les résultats dans reporting/benchmark_<label>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux benchmarks sauvegardés")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in TEST_SCENARIOS]
+    if unknown:
+        parser.error(f"scénarios inconnus: {', '.join(unknown)}")
+    
+    if args.compare:
+        compare_benchmarks(*args.compare)
+    else:
+        main(BENCHMARK_SCENARIOS if args.benchmark else args.scenarios, duration=args.duration, label=args.label)
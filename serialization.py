@@ -0,0 +1,43 @@
+# serialization.py
+"""
+Sérialisation JSON rapide des réponses (opt-in : API_FAST_JSON=1)
+Les objets renvoyés par les handlers ont déjà été validés à l'entrée ou
+proviennent du stockage : le response_model ne les revalide plus, ils sont
+encodés directement par le sérialiseur de pydantic-core
+"""
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+from config import FAST_JSON
+
+# Classe par défaut des réponses dict (token, erreurs métier, contrôles)
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if FAST_JSON else JSONResponse
+
+
+@lru_cache(maxsize=None)
+def type_adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+class PrevalidatedJSONResponse(Response):
+    """Réponse JSON d'objets de confiance, sans passage par jsonable_encoder"""
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, annotation: Any, status_code: int = 200,
+                 headers: Optional[Mapping[str, str]] = None):
+        self.adapter = type_adapter(annotation)
+        super().__init__(content, status_code, headers)
+
+    def render(self, content: Any) -> bytes:
+        return self.adapter.dump_json(content)
+
+
+def fast_response(content: Any, annotation: Any, headers: Optional[Mapping[str, str]] = None) -> Any:
+    """Réponse pré-sérialisée si API_FAST_JSON est actif, sinon validation par response_model"""
+    if not FAST_JSON:
+        return content
+    return PrevalidatedJSONResponse(content, annotation, headers=headers)
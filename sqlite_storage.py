@@ -0,0 +1,469 @@
+# sqlite_storage.py
+"""
+Backend de stockage SQLite (mode WAL) pour l'API BuyYourKawa
+Mêmes méthodes que les repositories en mémoire, ce qui permet de partager
+les données entre plusieurs workers uvicorn et de survivre aux redémarrages.
+Les requêtes sont paramétrées (instructions préparées mises en cache par
+connexion) et s'appuient sur des index id / client_id / status / created_at
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from analytics import PeriodSummary
+from lifecycle import check_transition
+from models import Address, Client, Order, OrderItem, OrderStatus, Product, ProductCategory
+from repositories import InsufficientStock, ProductNotFound
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    street TEXT NOT NULL,
+    city TEXT NOT NULL,
+    zip TEXT NOT NULL,
+    country TEXT NOT NULL,
+    loyalty_points INTEGER NOT NULL,
+    is_active INTEGER NOT NULL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS products (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    price REAL NOT NULL,
+    category TEXT NOT NULL,
+    is_available INTEGER NOT NULL,
+    stock_quantity INTEGER NOT NULL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products (category, seq);
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    client_id TEXT NOT NULL,
+    client_name TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    status TEXT NOT NULL,
+    notes TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_client ON orders (client_id, seq);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, seq);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price REAL NOT NULL,
+    total_price REAL NOT NULL,
+    PRIMARY KEY (order_id, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS collection_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO collection_versions (name, version) VALUES ('clients', 0), ('products', 0), ('orders', 0);
+"""
+
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _to_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteDatabase:
+    """Connexions SQLite par thread (threadpool AnyIO), base en mode WAL"""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None : transactions gérées explicitement (BEGIN IMMEDIATE)
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                         cached_statements=256)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transaction d'écriture ; le verrou est pris dès le BEGIN (pas d'upgrade en cours de route)"""
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SQLiteRepository:
+    """Base commune : pagination par seq (clé stable) et version de collection"""
+
+    blocking = True
+    table = ""
+    columns: Tuple[str, ...] = ()
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+        names = ", ".join(self.columns)
+        self._select = f"SELECT seq, {names} FROM {self.table}"
+        self._insert = (f"INSERT INTO {self.table} ({names}) "
+                        f"VALUES ({', '.join('?' for _ in self.columns)})")
+
+    # Conversions ligne <-> modèle, propres à chaque table
+    def _from_row(self, row: tuple):
+        raise NotImplementedError
+
+    def _to_row(self, entity) -> tuple:
+        raise NotImplementedError
+
+    def _bump_version(self, connection: sqlite3.Connection) -> None:
+        connection.execute("UPDATE collection_versions SET version = version + 1 WHERE name = ?", (self.table,))
+
+    @property
+    def version(self) -> int:
+        row = self.database.connection().execute(
+            "SELECT version FROM collection_versions WHERE name = ?", (self.table,)
+        ).fetchone()
+        return row[0]
+
+    def touch(self) -> None:
+        with self.database.transaction() as connection:
+            self._bump_version(connection)
+
+    def add(self, entity):
+        return self.add_many([entity])[0]
+
+    def add_many(self, entities: Iterable) -> List:
+        """Insérer un lot dans une seule transaction : tout ou rien"""
+        entities = list(entities)
+        with self.database.transaction() as connection:
+            try:
+                self._insert_rows(connection, entities)
+            except sqlite3.IntegrityError:
+                raise ValueError("Duplicate id in batch")
+            self._bump_version(connection)
+        return entities
+
+    def _insert_rows(self, connection: sqlite3.Connection, entities: List) -> None:
+        connection.executemany(self._insert, [self._to_row(entity) for entity in entities])
+
+    def extend(self, entities: Iterable) -> None:
+        self.add_many(entities)
+
+    def get(self, entity_id: str):
+        row = self.database.connection().execute(f"{self._select} WHERE id = ?", (entity_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def update(self, entity):
+        assignments = ", ".join(f"{column} = ?" for column in self.columns[1:])
+        values = self._to_row(entity)
+        with self.database.transaction() as connection:
+            connection.execute(f"UPDATE {self.table} SET {assignments} WHERE id = ?", values[1:] + (values[0],))
+            self._bump_version(connection)
+        return entity
+
+    def count(self) -> int:
+        return self.database.connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def all(self) -> List:
+        rows = self.database.connection().execute(f"{self._select} ORDER BY seq").fetchall()
+        return self._from_rows(rows)
+
+    def _from_rows(self, rows: List[tuple]) -> List:
+        return [self._from_row(row) for row in rows]
+
+    def _paginate(self, sql: str, params: tuple, limit: int) -> Tuple[List, Optional[int]]:
+        # Une ligne de plus que la page pour connaître le départ de la page suivante
+        rows = self.database.connection().execute(sql, params + (limit + 1,)).fetchall()
+        next_start = rows[limit][0] if len(rows) > limit else None
+        return self._from_rows(rows[:limit]), next_start
+
+    def page_after(self, start: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        """Page par clé : seq >= start (index de la clé primaire, pas d'OFFSET)"""
+        return self._paginate(f"{self._select} WHERE seq >= ? ORDER BY seq LIMIT ?", (start,), limit)
+
+    def page_from_offset(self, skip: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        rows = self.database.connection().execute(
+            f"{self._select} ORDER BY seq LIMIT ? OFFSET ?", (limit + 1, skip)
+        ).fetchall()
+        next_start = rows[limit][0] if len(rows) > limit else None
+        return self._from_rows(rows[:limit]), next_start
+
+    def page(self, skip: int = 0, limit: int = 100) -> List:
+        return self.page_from_offset(skip, limit)[0]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self) -> Iterator:
+        return iter(self.all())
+
+    def __contains__(self, entity_id: object) -> bool:
+        return self.get(entity_id) is not None
+
+
+class SQLiteClientRepository(SQLiteRepository):
+    table = "clients"
+    columns = ("id", "name", "email", "phone", "street", "city", "zip", "country",
+               "loyalty_points", "is_active", "created_at", "updated_at")
+
+    def _to_row(self, client: Client) -> tuple:
+        address = client.address
+        return (client.id, client.name, client.email, client.phone, address.street, address.city,
+                address.zip, address.country, client.loyalty_points, int(client.is_active),
+                _to_text(client.created_at), _to_text(client.updated_at))
+
+    def _from_row(self, row: tuple) -> Client:
+        # Données validées à l'écriture : reconstruction sans revalidation
+        return Client.model_construct(
+            id=row[1], name=row[2], email=row[3], phone=row[4],
+            address=Address.model_construct(street=row[5], city=row[6], zip=row[7], country=row[8]),
+            loyalty_points=row[9], is_active=bool(row[10]),
+            created_at=_to_datetime(row[11]), updated_at=_to_datetime(row[12])
+        )
+
+
+class SQLiteProductRepository(SQLiteRepository):
+    table = "products"
+    columns = ("id", "name", "description", "price", "category", "is_available", "stock_quantity",
+               "created_at", "updated_at")
+
+    def _to_row(self, product: Product) -> tuple:
+        return (product.id, product.name, product.description, product.price,
+                ProductCategory(product.category).value, int(product.is_available), product.stock_quantity,
+                _to_text(product.created_at), _to_text(product.updated_at))
+
+    def _from_row(self, row: tuple) -> Product:
+        return Product.model_construct(
+            id=row[1], name=row[2], description=row[3], price=row[4], category=ProductCategory(row[5]),
+            is_available=bool(row[6]), stock_quantity=row[7],
+            created_at=_to_datetime(row[8]), updated_at=_to_datetime(row[9])
+        )
+
+    def filter(self, category: Optional[str] = None, available_only: bool = False) -> List[Product]:
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(ProductCategory(category).value)
+        if available_only:
+            conditions.append("is_available = 1 AND stock_quantity > 0")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.database.connection().execute(f"{self._select}{where} ORDER BY seq", params).fetchall()
+        return self._from_rows(rows)
+
+    def seed(self, products: Iterable[Product]) -> None:
+        """Insérer le catalogue initial une seule fois, même si plusieurs workers démarrent ensemble"""
+        with self.database.transaction() as connection:
+            cursor = connection.executemany(self._insert.replace("INSERT", "INSERT OR IGNORE", 1),
+                                            [self._to_row(product) for product in products])
+            if cursor.rowcount:
+                self._bump_version(connection)
+
+    def reserve(self, quantities: Dict[str, int]) -> List[Product]:
+        """Vérifier et décrémenter les stocks dans une seule transaction d'écriture"""
+        with self.database.transaction() as connection:
+            products = []
+            for product_id in quantities:
+                row = connection.execute(f"{self._select} WHERE id = ?", (product_id,)).fetchone()
+                if row is None:
+                    raise ProductNotFound(product_id)
+                products.append(self._from_row(row))
+            for product in products:
+                if product.stock_quantity < quantities[product.id]:
+                    raise InsufficientStock(product)
+            for product in products:
+                product.stock_quantity -= quantities[product.id]
+                connection.execute("UPDATE products SET stock_quantity = ? WHERE id = ?",
+                                   (product.stock_quantity, product.id))
+            self._bump_version(connection)
+        return products
+
+    def release(self, quantities: Dict[str, int]) -> None:
+        """Rendre des quantités réservées, en une transaction"""
+        with self.database.transaction() as connection:
+            connection.executemany("UPDATE products SET stock_quantity = stock_quantity + ? WHERE id = ?",
+                                   [(quantity, product_id) for product_id, quantity in quantities.items()])
+            self._bump_version(connection)
+
+
+class SQLiteOrderRepository(SQLiteRepository):
+    table = "orders"
+    columns = ("id", "client_id", "client_name", "total_amount", "status", "notes", "created_at", "updated_at")
+    item_columns = ("order_id", "line", "product_id", "product_name", "quantity", "unit_price", "total_price")
+
+    def _to_row(self, order: Order) -> tuple:
+        return (order.id, order.client_id, order.client_name, order.total_amount,
+                OrderStatus(order.status).value, order.notes,
+                _to_text(order.created_at), _to_text(order.updated_at))
+
+    def _from_row(self, row: tuple, items: Optional[List[OrderItem]] = None) -> Order:
+        return Order.model_construct(
+            id=row[1], client_id=row[2], client_name=row[3], items=items or [], total_amount=row[4],
+            status=OrderStatus(row[5]), notes=row[6],
+            created_at=_to_datetime(row[7]), updated_at=_to_datetime(row[8])
+        )
+
+    def _from_rows(self, rows: List[tuple]) -> List[Order]:
+        """Commandes et leurs lignes, chargées en une seule requête sur order_items"""
+        if not rows:
+            return []
+        ids = [row[1] for row in rows]
+        items: Dict[str, List[OrderItem]] = {order_id: [] for order_id in ids}
+        connection = self.database.connection()
+        # Par lots pour rester sous la limite de paramètres SQLite
+        for offset in range(0, len(ids), 500):
+            batch = ids[offset:offset + 500]
+            item_rows = connection.execute(
+                f"SELECT {', '.join(self.item_columns)} FROM order_items "
+                f"WHERE order_id IN ({', '.join('?' for _ in batch)}) ORDER BY order_id, line",
+                batch
+            ).fetchall()
+            for item in item_rows:
+                items[item[0]].append(OrderItem.model_construct(
+                    product_id=item[2], product_name=item[3], quantity=item[4],
+                    unit_price=item[5], total_price=item[6]
+                ))
+        return [self._from_row(row, items[row[1]]) for row in rows]
+
+    def get(self, order_id: str) -> Optional[Order]:
+        row = self.database.connection().execute(f"{self._select} WHERE id = ?", (order_id,)).fetchone()
+        return self._from_rows([row])[0] if row else None
+
+    def _insert_rows(self, connection: sqlite3.Connection, orders: List[Order]) -> None:
+        super()._insert_rows(connection, orders)
+        connection.executemany(
+            f"INSERT INTO order_items ({', '.join(self.item_columns)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(order.id, line, item.product_id, item.product_name, item.quantity,
+              item.unit_price, item.total_price) for order in orders for line, item in enumerate(order.items)]
+        )
+
+    def transition(self, order_id: str, status, updated_at: Optional[datetime] = None) -> Optional[Order]:
+        """
+        Lecture du statut, vérification et écriture sous le même verrou d'écriture
+        Une annulation remet les articles en stock dans la même transaction
+        """
+        with self.database.transaction() as connection:
+            row = connection.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()
+            if row is None:
+                return None
+            check_transition(row[0], status)
+            connection.execute("UPDATE orders SET status = ?, updated_at = ? WHERE id = ?",
+                               (OrderStatus(status).value, _to_text(updated_at), order_id))
+            self._bump_version(connection)
+            if OrderStatus(status) == OrderStatus.CANCELLED:
+                connection.execute(
+                    "UPDATE products SET stock_quantity = stock_quantity + "
+                    "(SELECT SUM(quantity) FROM order_items WHERE order_id = ? AND product_id = products.id) "
+                    "WHERE id IN (SELECT product_id FROM order_items WHERE order_id = ?)",
+                    (order_id, order_id)
+                )
+                connection.execute("UPDATE collection_versions SET version = version + 1 WHERE name = 'products'")
+        return self.get(order_id)
+
+    def next_with_status(self, status) -> Optional[Order]:
+        """Plus ancienne commande d'un statut, servie par l'index (status, seq)"""
+        row = self.database.connection().execute(
+            f"{self._select} WHERE status = ? ORDER BY seq LIMIT 1", (OrderStatus(status).value,)
+        ).fetchone()
+        return self._from_rows([row])[0] if row else None
+
+    def find(self, status: Optional[str] = None, client_id: Optional[str] = None) -> List[Order]:
+        orders, _ = self.find_page(status, client_id, 0, -1)
+        return orders
+
+    def find_page(self, status: Optional[str] = None, client_id: Optional[str] = None,
+                  start: int = 0, limit: int = 100) -> Tuple[List[Order], Optional[int]]:
+        """Filtres servis par les index (status, seq) et (client_id, seq)"""
+        conditions, params = ["seq >= ?"], [start]
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(OrderStatus(status).value)
+        if client_id is not None:
+            conditions.append("client_id = ?")
+            params.append(client_id)
+        sql = f"{self._select} WHERE {' AND '.join(conditions)} ORDER BY seq LIMIT ?"
+        if limit < 0:
+            rows = self.database.connection().execute(sql, tuple(params) + (-1,)).fetchall()
+            return self._from_rows(rows), None
+        return self._paginate(sql, tuple(params), limit)
+
+    def summarize(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  top_k: int = 5) -> PeriodSummary:
+        """Agrégats de [start, end) calculés par la base, communs à tous les workers"""
+        # Les commandes annulées ne comptent pas dans le chiffre d'affaires
+        conditions, params = ["o.status != ?"], [OrderStatus.CANCELLED.value]
+        if start is not None:
+            conditions.append("o.created_at >= ?")
+            params.append(_to_text(start))
+        if end is not None:
+            conditions.append("o.created_at < ?")
+            params.append(_to_text(end))
+        where = f" WHERE {' AND '.join(conditions)}"
+        connection = self.database.connection()
+        summary = PeriodSummary(top_k)
+        summary.total_orders, summary.total_revenue = connection.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(o.total_amount), 0) FROM orders o{where}", params
+        ).fetchone()
+        summary.product_quantities = dict(connection.execute(
+            f"SELECT i.product_name, SUM(i.quantity) FROM order_items i "
+            f"JOIN orders o ON o.id = i.order_id{where} GROUP BY i.product_name", params
+        ).fetchall())
+        return summary
+
+    def breakdown(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  granularity: str = "day") -> List[dict]:
+        """Commandes et revenus par heure ou par jour (préfixe de created_at), buckets non vides"""
+        width = 13 if granularity == "hour" else 10
+        conditions, params = ["status != ?"], [OrderStatus.CANCELLED.value]
+        if start is not None:
+            conditions.append("created_at >= ?")
+            params.append(_to_text(start))
+        if end is not None:
+            conditions.append("created_at < ?")
+            params.append(_to_text(end))
+        where = f" WHERE {' AND '.join(conditions)}"
+        rows = self.database.connection().execute(
+            f"SELECT substr(created_at, 1, {width}) AS bucket, COUNT(*), SUM(total_amount) "
+            f"FROM orders{where} GROUP BY bucket ORDER BY bucket", params
+        ).fetchall()
+        return [
+            {"period_start": datetime.fromisoformat(bucket + (":00" if granularity == "hour" else "")),
+             "total_orders": count, "total_revenue": round(revenue, 2)}
+            for bucket, count, revenue in rows
+        ]
@@ -0,0 +1,105 @@
+# storage.py
+"""
+Interface de stockage asynchrone de l'API BuyYourKawa
+Les handlers async accèdent aux repositories via ces façades : un backend en
+mémoire est appelé directement sur la boucle d'événements (aucun saut vers le
+threadpool), un backend bloquant (SQLite) est exécuté dans le threadpool AnyIO
+"""
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+
+from repositories import ClientRepository, OrderRepository, ProductRepository
+
+
+class AsyncRepository:
+    """Façade asynchrone d'un repository"""
+
+    def __init__(self, repository, blocking: Optional[bool] = None):
+        self.repository = repository
+        # Par défaut, le repository indique lui-même s'il fait des entrées/sorties
+        self.blocking = getattr(repository, "blocking", False) if blocking is None else blocking
+
+    async def _call(self, method: Callable, *args, **kwargs) -> Any:
+        if self.blocking:
+            return await anyio.to_thread.run_sync(functools.partial(method, *args, **kwargs))
+        return method(*args, **kwargs)
+
+    async def current_version(self) -> int:
+        return await self._call(getattr, self.repository, "version")
+
+    async def get(self, entity_id: str):
+        return await self._call(self.repository.get, entity_id)
+
+    async def add(self, entity):
+        return await self._call(self.repository.add, entity)
+
+    async def add_many(self, entities: List) -> List:
+        return await self._call(self.repository.add_many, entities)
+
+    async def update(self, entity):
+        return await self._call(self.repository.update, entity)
+
+    async def count(self) -> int:
+        return await self._call(self.repository.count)
+
+    async def all(self) -> List:
+        return await self._call(self.repository.all)
+
+    async def page_after(self, start: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        return await self._call(self.repository.page_after, start, limit)
+
+    async def page_from_offset(self, skip: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        return await self._call(self.repository.page_from_offset, skip, limit)
+
+
+class AsyncProductRepository(AsyncRepository):
+
+    async def filter(self, category: Optional[str] = None, available_only: bool = False) -> List:
+        return await self._call(self.repository.filter, category, available_only)
+
+    async def reserve(self, quantities: Dict[str, int]) -> List:
+        return await self._call(self.repository.reserve, quantities)
+
+    async def release(self, quantities: Dict[str, int]) -> None:
+        return await self._call(self.repository.release, quantities)
+
+
+class AsyncOrderRepository(AsyncRepository):
+
+    async def find_page(self, status: Optional[str] = None, client_id: Optional[str] = None,
+                        start: int = 0, limit: int = 100) -> Tuple[List, Optional[int]]:
+        return await self._call(self.repository.find_page, status, client_id, start, limit)
+
+    async def transition(self, order_id: str, status, updated_at=None):
+        return await self._call(self.repository.transition, order_id, status, updated_at)
+
+    async def next_with_status(self, status):
+        return await self._call(self.repository.next_with_status, status)
+
+    async def summarize(self, start=None, end=None, top_k: int = 5):
+        return await self._call(self.repository.summarize, start, end, top_k)
+
+    async def breakdown(self, start=None, end=None, granularity: str = "day") -> List[dict]:
+        return await self._call(self.repository.breakdown, start, end, granularity)
+
+
+def configure_threadpool(size: int) -> None:
+    """Fixer le nombre de threads du threadpool AnyIO (40 par défaut)"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def create_repositories(backend: str = "memory", sqlite_path: str = "buyyourkawa.db") -> Tuple:
+    """Repositories clients, produits et commandes du backend choisi (memory ou sqlite)"""
+    if backend == "memory":
+        products = ProductRepository()
+        return ClientRepository(), products, OrderRepository(products)
+    if backend == "sqlite":
+        from sqlite_storage import (
+            SQLiteClientRepository, SQLiteDatabase, SQLiteOrderRepository, SQLiteProductRepository
+        )
+        database = SQLiteDatabase(sqlite_path)
+        return (SQLiteClientRepository(database), SQLiteProductRepository(database),
+                SQLiteOrderRepository(database))
+    raise ValueError(f"Unknown storage backend {backend!r}")
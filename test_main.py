@@ -155,3 +155,1008 @@ def test_client_delete():
     )
     assert response.status_code == 200
     assert response.json()["message"] == "Client deleted successfully"
+
+def get_admin_headers():
+    response = client.post(
+        "/token",
+        data={"username": "admin", "password": "password"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def create_test_client(headers):
+    response = client.post(
+        "/clients",
+        json={
+            "name": "Test Client",
+            "email": "test@example.com",
+            "phone": "+33123456789",
+            "address": {
+                "street": "123 Rue Test",
+                "city": "Paris",
+                "zip": "75000",
+                "country": "France"
+            }
+        },
+        headers=headers
+    )
+    return response.json()
+
+def test_client_lookup_by_id():
+    headers = get_admin_headers()
+    created = create_test_client(headers)
+
+    response = client.get(f"/clients/{created['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == created["id"]
+
+    response = client.get("/clients/unknown-id", headers=headers)
+    assert response.status_code == 404
+
+def test_repository_keeps_insertion_order():
+    from repositories import ClientRepository
+    from models import Client
+
+    repository = ClientRepository()
+    for i in range(5):
+        repository.add(Client(
+            id=str(i),
+            name=f"Client {i}",
+            email=f"client{i}@example.com",
+            phone="+33123456789",
+            address={"street": "1 Rue Test", "city": "Paris", "zip": "75001"}
+        ))
+
+    assert repository.get("3").name == "Client 3"
+    assert [c.id for c in repository[1:3]] == ["1", "2"]
+    assert [c.id for c in repository.page(3, 10)] == ["3", "4"]
+    assert len(repository) == 5
+
+def create_test_order(headers, client_id, product_id="1", quantity=1):
+    product = client.get("/products", headers=headers).json()
+    product = next(p for p in product if p["id"] == product_id)
+    total = round(product["price"] * quantity, 2)
+    response = client.post(
+        "/orders",
+        json={
+            "client_id": client_id,
+            "client_name": "Test Client",
+            "items": [{
+                "product_id": product_id,
+                "product_name": product["name"],
+                "quantity": quantity,
+                "unit_price": product["price"],
+                "total_price": total
+            }],
+            "total_amount": total
+        },
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def test_orders_filtered_by_secondary_indexes():
+    headers = get_admin_headers()
+    first_client = create_test_client(headers)["id"]
+    second_client = create_test_client(headers)["id"]
+    first_order = create_test_order(headers, first_client)
+    create_test_order(headers, second_client)
+
+    response = client.get("/orders", params={"client_id": first_client}, headers=headers)
+    assert [o["id"] for o in response.json()["items"]] == [first_order["id"]]
+
+    response = client.get("/orders", params={"client_id": first_client, "status": "pending"}, headers=headers)
+    assert [o["id"] for o in response.json()["items"]] == [first_order["id"]]
+
+    response = client.get("/orders", params={"client_id": first_client, "status": "ready"}, headers=headers)
+    assert response.json()["items"] == []
+
+def test_order_status_index_update():
+    from repositories import OrderRepository
+    from models import Order, OrderStatus
+
+    repository = OrderRepository()
+    orders = [
+        repository.add(Order(
+            id=str(i),
+            client_id="c1" if i % 2 else "c2",
+            client_name="Client",
+            items=[{"product_id": "1", "product_name": "Espresso", "quantity": 1, "unit_price": 2.5, "total_price": 2.5}],
+            total_amount=2.5
+        ))
+        for i in range(4)
+    ]
+
+    repository.transition(orders[1].id, OrderStatus.CONFIRMED)
+    assert [o.id for o in repository.find(status=OrderStatus.PENDING)] == ["0", "2", "3"]
+    assert [o.id for o in repository.find(status=OrderStatus.CONFIRMED, client_id="c1")] == ["1"]
+    assert [o.id for o in repository.find(client_id="c2")] == ["0", "2"]
+
+def test_cursor_pagination():
+    headers = get_admin_headers()
+    for _ in range(3):
+        create_test_client(headers)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/clients", params=params, headers=headers).json()
+        assert len(page["items"]) <= 2
+        seen.extend(c["id"] for c in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert len(seen) >= 3
+
+    response = client.get("/orders", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+def test_analytics_aggregates_are_consistent():
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+    before = client.get("/analytics", headers=headers).json()
+    create_test_order(headers, client_id, product_id="2", quantity=2)
+
+    after = client.get("/analytics", headers=headers).json()
+    assert after["total_orders"] == before["total_orders"] + 1
+    assert round(after["total_revenue"] - before["total_revenue"], 2) == 7.6
+
+    response = client.get("/analytics/consistency", headers=headers)
+    assert response.json()["consistent"] is True
+
+def test_analytics_top_k_ranking():
+    from analytics import AnalyticsAggregates
+    from types import SimpleNamespace
+
+    def order(*items):
+        return SimpleNamespace(
+            total_amount=sum(q for _, q in items),
+            items=[SimpleNamespace(product_name=name, quantity=q) for name, q in items]
+        )
+
+    aggregates = AnalyticsAggregates(top_k=2)
+    aggregates.record_order(order(("Espresso", 1), ("Croissant", 2)))
+    aggregates.record_order(order(("Thé", 3)))
+    aggregates.record_order(order(("Espresso", 4)))
+
+    assert aggregates.top_products() == [
+        {"name": "Espresso", "quantity_sold": 5},
+        {"name": "Thé", "quantity_sold": 3}
+    ]
+    assert aggregates.total_orders == 3
+
+def test_analytics_time_buckets():
+    from analytics import TimeBucketedAnalytics, resolve_period
+    from datetime import date, datetime
+    from types import SimpleNamespace
+
+    def order(created_at, amount):
+        return SimpleNamespace(
+            created_at=created_at,
+            total_amount=amount,
+            items=[SimpleNamespace(product_name="Espresso", quantity=1)]
+        )
+
+    buckets = TimeBucketedAnalytics()
+    buckets.record_order(order(datetime(2024, 3, 1, 9, 15), 10.0))
+    buckets.record_order(order(datetime(2024, 3, 2, 23, 59), 20.0))
+    buckets.record_order(order(datetime(2024, 3, 4, 8, 0), 40.0))
+
+    summary = buckets.summarize(datetime(2024, 3, 1, 10, 0), datetime(2024, 3, 4, 9, 0))
+    assert summary.total_orders == 2
+    assert summary.total_revenue == 60.0
+
+    start, end = resolve_period("daily", date(2024, 3, 1), date(2024, 3, 2))
+    assert buckets.summarize(start, end).total_revenue == 30.0
+
+    start, end = resolve_period("today", now=datetime(2024, 3, 4, 12, 0))
+    assert buckets.summarize(start, end).top_products() == [{"name": "Espresso", "quantity_sold": 1}]
+
+def test_analytics_period_parameters():
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+    create_test_order(headers, client_id)
+
+    today = client.get("/analytics", params={"period": "today"}, headers=headers).json()
+    assert today["total_orders"] >= 1
+
+    past = client.get(
+        "/analytics",
+        params={"period": "monthly", "start_date": "2024-01-01", "end_date": "2024-12-31"},
+        headers=headers
+    ).json()
+    assert past["total_orders"] == 0
+
+def test_response_cache_ttl_and_lru():
+    from cache import ResponseCache
+    import time
+
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.05)
+    cache.set("/products", ("a",), 1)
+    cache.set("/products", ("b",), 2)
+    assert cache.get("/products", ("a",)) == 1
+    cache.set("/analytics", ("c",), 3)
+    # ("b",) est l'entrée la moins récemment utilisée
+    assert cache.get("/products", ("b",)) is None
+    assert cache.get("/products", ("a",)) == 1
+
+    cache.invalidate("/products")
+    assert cache.get("/products", ("a",)) is None
+    time.sleep(0.06)
+    assert cache.get("/analytics", ("c",)) is None
+
+def test_products_cache_invalidated_by_writes():
+    headers = get_admin_headers()
+    before = client.get("/products", headers=headers).json()
+    response = client.post(
+        "/products",
+        json={
+            "name": "Flat White",
+            "description": "Café au lait micro-moussé",
+            "price": 3.9,
+            "category": "coffee",
+            "stock_quantity": 20
+        },
+        headers=headers
+    )
+    after = client.get("/products", headers=headers).json()
+    assert len(after) == len(before) + 1
+    assert response.json()["id"] in [p["id"] for p in after]
+
+def test_conditional_get_with_etag():
+    headers = get_admin_headers()
+    created = create_test_client(headers)
+
+    response = client.get(f"/clients/{created['id']}", headers=headers)
+    etag = response.headers["ETag"]
+    response = client.get(f"/clients/{created['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/products", headers=headers)
+    products_etag = response.headers["ETag"]
+    response = client.get("/products", headers={**headers, "If-None-Match": products_etag})
+    assert response.status_code == 304
+
+    # Une commande modifie les stocks : la version du catalogue change
+    create_test_order(headers, created["id"])
+    response = client.get("/products", headers={**headers, "If-None-Match": products_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != products_etag
+
+def test_jwt_verification_cache():
+    from main import token_cache, create_access_token
+    import time
+
+    token = create_access_token(data={"sub": "jwt-cache-user"})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert token_cache.get(token) is None
+
+    assert client.get("/products", headers=headers).status_code == 200
+    assert token_cache.get(token) == "jwt-cache-user"
+
+    response = client.get("/products", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 401
+
+    # Une entrée expirée est évincée et la vérification complète reprend
+    token_cache.set("expired", "admin", time.time() - 1)
+    assert token_cache.get("expired") is None
+
+def test_refresh_token_flow():
+    response = client.post("/token", data={"username": "admin", "password": "password"})
+    tokens = response.json()
+    assert tokens["expires_in"] > 0
+
+    # Un refresh token ne donne pas accès aux routes protégées
+    response = client.get("/products", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+
+    response = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    access_token = response.json()["access_token"]
+    response = client.get("/products", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 200
+
+    response = client.post("/token/refresh", json={"refresh_token": tokens["access_token"]})
+    assert response.status_code == 401
+
+def test_concurrent_stock_reservation_never_oversells():
+    from repositories import ProductRepository, InsufficientStock
+    from models import Product, ProductCategory
+    from concurrent.futures import ThreadPoolExecutor
+
+    repository = ProductRepository()
+    repository.add(Product(id="p1", name="Espresso", description="Café espresso traditionnel", price=2.5, category=ProductCategory.COFFEE, stock_quantity=50))
+    repository.add(Product(id="p2", name="Croissant", description="Viennoiserie française", price=1.9, category=ProductCategory.PASTRY, stock_quantity=500))
+
+    def reserve(_):
+        try:
+            repository.reserve({"p2": 1, "p1": 1})
+            return True
+        except InsufficientStock:
+            return False
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(reserve, range(200)))
+
+    assert results.count(True) == 50
+    assert repository.get("p1").stock_quantity == 0
+    assert repository.get("p2").stock_quantity == 450
+
+def test_order_rejected_when_stock_insufficient():
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+    response = client.post(
+        "/orders",
+        json={
+            "client_id": client_id,
+            "client_name": "Test Client",
+            "items": [
+                {"product_id": "5", "product_name": "Sandwich Jambon", "quantity": 20, "unit_price": 4.5, "total_price": 90.0},
+                {"product_id": "5", "product_name": "Sandwich Jambon", "quantity": 20, "unit_price": 4.5, "total_price": 90.0}
+            ],
+            "total_amount": 180.0
+        },
+        headers=headers
+    )
+    assert response.status_code == 400
+    assert "Insufficient stock for Sandwich Jambon" in response.json()["detail"]
+
+def test_order_priced_by_server():
+    headers = get_admin_headers()
+    customer = create_test_client(headers)
+    catalogue = {p["id"]: p for p in client.get("/products?available_only=false", headers=headers).json()}
+
+    # Payload réduit : client et couples produit/quantité
+    response = client.post("/orders", json={
+        "client_id": customer["id"],
+        "items": [{"product_id": "1", "quantity": 2}, {"product_id": "2", "quantity": 1}]
+    }, headers=headers)
+    assert response.status_code == 200
+    order = response.json()
+    assert order["client_name"] == customer["name"]
+    assert order["items"][0]["product_name"] == catalogue["1"]["name"]
+    assert order["items"][0]["total_price"] == round(catalogue["1"]["price"] * 2, 2)
+    assert order["total_amount"] == round(catalogue["1"]["price"] * 2 + catalogue["2"]["price"], 2)
+
+    # Ancien payload complet : prix et totaux falsifiés ignorés
+    response = client.post("/orders", json={
+        "client_id": customer["id"],
+        "client_name": "Autre",
+        "items": [{"product_id": "1", "product_name": "Gratuit", "quantity": 1, "unit_price": 0.01, "total_price": 0.01}],
+        "total_amount": 0.01
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["unit_price"] == catalogue["1"]["price"]
+    assert response.json()["total_amount"] == catalogue["1"]["price"]
+    assert response.json()["client_name"] == customer["name"]
+
+def test_async_storage_facade():
+    import anyio
+    import threading
+    from storage import AsyncRepository
+    from repositories import ClientRepository
+    from models import Client
+
+    repository = ClientRepository()
+    repository.add(Client(
+        id="c1",
+        name="Client Async",
+        email="async@example.com",
+        phone="+33123456789",
+        address={"street": "1 Rue Test", "city": "Paris", "zip": "75001"}
+    ))
+    threads = []
+    original_get = repository.get
+
+    def tracking_get(client_id):
+        threads.append(threading.current_thread())
+        return original_get(client_id)
+
+    repository.get = tracking_get
+
+    async def scenario():
+        direct = await AsyncRepository(repository).get("c1")
+        offloaded = await AsyncRepository(repository, blocking=True).get("c1")
+        return direct, offloaded
+
+    direct, offloaded = anyio.run(scenario)
+    assert direct.name == offloaded.name == "Client Async"
+    # Backend en mémoire : appel direct ; backend bloquant : threadpool
+    assert threads[0] is threading.main_thread()
+    assert threads[1] is not threading.main_thread()
+
+def test_sqlite_backend_matches_memory_interface(tmp_path):
+    from storage import create_repositories
+    from repositories import InsufficientStock
+    from models import Client, Product, Order, OrderItem, OrderStatus, ProductCategory
+
+    path = str(tmp_path / "kawa.db")
+    clients, products, orders = create_repositories("sqlite", path)
+    for index in range(5):
+        clients.add(Client(
+            id=f"c{index}",
+            name=f"Client {index}",
+            email=f"c{index}@example.com",
+            phone="+33123456789",
+            address={"street": "1 Rue Test", "city": "Paris", "zip": "75001"}
+        ))
+    products.add(Product(id="p1", name="Espresso", description="Café espresso", price=2.5,
+                         category=ProductCategory.COFFEE, stock_quantity=3))
+    version = products.version
+
+    page, next_start = clients.page_from_offset(0, 2)
+    assert [c.id for c in page] == ["c0", "c1"]
+    page, next_start = clients.page_after(next_start, 10)
+    assert [c.id for c in page] == ["c2", "c3", "c4"] and next_start is None
+
+    reserved = products.reserve({"p1": 2})
+    assert reserved[0].stock_quantity == 1
+    with pytest.raises(InsufficientStock):
+        products.reserve({"p1": 2})
+    assert products.get("p1").stock_quantity == 1
+    assert products.version == version + 1
+    assert [p.id for p in products.filter(None, False)] == ["p1"]
+    assert [p.id for p in products.filter(ProductCategory.COFFEE, True)] == ["p1"]
+
+    # Catalogue initial : un produit déjà présent n'est ni dupliqué ni réinitialisé
+    products.seed([
+        Product(id="p1", name="Espresso", description="Café espresso", price=2.5,
+                category=ProductCategory.COFFEE, stock_quantity=3),
+        Product(id="p2", name="Latte", description="Café au lait", price=3.5,
+                category=ProductCategory.COFFEE, stock_quantity=0),
+    ])
+    assert products.count() == 2 and products.get("p1").stock_quantity == 1
+
+    for index in range(3):
+        orders.add(Order(
+            id=f"o{index}",
+            client_id="c1" if index % 2 else "c0",
+            client_name="Client",
+            items=[OrderItem(product_id="p1", product_name="Espresso", quantity=1, unit_price=2.5, total_price=2.5)],
+            total_amount=2.5
+        ))
+    orders.transition("o2", OrderStatus.CONFIRMED)
+    found, _ = orders.find_page(status=OrderStatus.PENDING, client_id="c0", limit=10)
+    assert [o.id for o in found] == ["o0"]
+    assert orders.get("o2").status == OrderStatus.CONFIRMED
+    assert orders.get("o1").items[0].product_name == "Espresso"
+
+    # Les données survivent à la réouverture de la base
+    clients, products, orders = create_repositories("sqlite", path)
+    assert clients.count() == 5 and orders.count() == 3
+    assert clients.get("c3").address.city == "Paris"
+
+def test_order_journal_group_commit_and_replay(tmp_path):
+    import threading
+    from journal import OrderJournal, replay
+
+    path = str(tmp_path / "orders.jsonl")
+    batches = []
+    committing = threading.Event()
+    release = threading.Event()
+
+    def on_commit(size):
+        # Le premier fsync est retenu : les soumissions suivantes s'accumulent dans la file
+        batches.append(size)
+        committing.set()
+        release.wait(5)
+
+    journal = OrderJournal(path, on_commit=on_commit)
+    futures = [journal.submit({"order": {"id": "first"}, "stock": {"1": 1}})]
+    assert committing.wait(5)
+
+    def submit(worker):
+        for index in range(50):
+            futures.append(journal.submit({"order": {"id": f"{worker}-{index}"}, "stock": {"1": 1}}))
+
+    workers = [threading.Thread(target=submit, args=(worker,)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    journal.close()
+
+    # Tous les enregistrements sont écrits, en moins de fsync que d'enregistrements
+    assert sum(batches) == 201
+    assert len(batches) < 201
+    assert max(batches) > 1
+    with open(path, "a") as crashed:
+        crashed.write('{"order": {"id": "torn"')
+    records = list(replay(path))
+    assert len(records) == 201
+    assert {record["order"]["id"] for record in records} == {"first"} | {f"{w}-{i}" for w in range(4) for i in range(50)}
+
+def test_sqlite_analytics_summary_matches_rebuild(tmp_path):
+    from datetime import datetime
+    from analytics import AnalyticsAggregates
+    from storage import create_repositories
+    from models import Order, OrderItem
+
+    _, _, orders = create_repositories("sqlite", str(tmp_path / "kawa.db"))
+    for index, day in enumerate([1, 2, 2, 3]):
+        orders.add(Order(
+            id=f"o{index}",
+            client_id="c0",
+            client_name="Client",
+            items=[OrderItem(product_id="p1", product_name="Espresso", quantity=index + 1, unit_price=2.5, total_price=2.5 * (index + 1))],
+            total_amount=2.5 * (index + 1),
+            created_at=datetime(2024, 5, day, 12)
+        ))
+
+    # Les agrégats SQL (partagés entre workers) égalent une reconstruction complète
+    assert AnalyticsAggregates.from_orders(orders.all()).matches(orders.summarize())
+    summary = orders.summarize(datetime(2024, 5, 2), datetime(2024, 5, 3))
+    assert summary.total_orders == 2
+    assert summary.top_products() == [{"name": "Espresso", "quantity_sold": 5}]
+
+def test_two_workers_start_on_fresh_sqlite_database(tmp_path):
+    import os
+    import socket
+    import sqlite3
+    import subprocess
+    import sys
+    import time
+    import urllib.request
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    database = tmp_path / "kawa.db"
+    (tmp_path / "metrics").mkdir()
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=str(database), API_WORKERS="2",
+               API_HOST="127.0.0.1", API_PORT=str(port), PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"))
+    server = subprocess.Popen([sys.executable, os.path.abspath("main.py")], cwd=tmp_path, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        # Les deux workers importent main (et seedent le catalogue) en même temps
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1)
+                break
+            except OSError:
+                assert server.poll() is None and time.monotonic() < deadline
+                time.sleep(0.2)
+        time.sleep(1)
+    finally:
+        server.terminate()
+        output, _ = server.communicate(timeout=30)
+
+    assert output.count("Application startup complete") == 2, output
+    assert "Traceback" not in output, output
+    with sqlite3.connect(database) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 5
+
+def test_prevalidated_json_response_matches_response_model():
+    import json
+    from typing import List
+    from serialization import PrevalidatedJSONResponse
+    from models import Product
+
+    token = client.post("/token", data={"username": "admin", "password": "password"}).json()["access_token"]
+    response = client.get("/products?available_only=false", headers={"Authorization": f"Bearer {token}"})
+    products = [Product.model_validate(product) for product in response.json()]
+
+    fast = PrevalidatedJSONResponse(products, List[Product], headers={"ETag": response.headers["ETag"]})
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.headers["ETag"] == response.headers["ETag"]
+    assert json.loads(fast.body) == response.json()
+
+def test_streaming_exports():
+    import csv
+    import io
+    import json
+    from export import iter_pages
+    from repositories import InMemoryRepository
+
+    token = client.post("/token", data={"username": "admin", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for index in range(3):
+        client.post("/clients", json={
+            "name": f"Client Export {index}",
+            "email": f"export{index}@example.com",
+            "phone": "+33123456789",
+            "address": {"street": "1 Rue Test", "city": "Paris", "zip": "75001"}
+        }, headers=headers)
+    total = client.get("/analytics?period=all", headers=headers).json()["client_count"]
+
+    response = client.get("/clients/export", headers=headers)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert len(lines) == total
+    assert "name" in json.loads(lines[-1])
+
+    response = client.get("/clients/export?format=csv", headers=headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][:2] == ["id", "name"] and len(rows) == total + 1
+
+    response = client.get("/orders/export?format=csv&status=delivered", headers=headers)
+    assert response.status_code == 200
+    assert response.text.splitlines()[0].startswith("order_id,")
+
+    # Lecture par pages bornées : toutes les entités, dans l'ordre d'insertion
+    import anyio
+    from types import SimpleNamespace
+    repository = InMemoryRepository()
+    repository.extend(SimpleNamespace(id=str(i)) for i in range(1201))
+
+    async def collect():
+        async def fetch(start, limit):
+            return repository.page_after(start, limit)
+        return [len(page) async for page in iter_pages(fetch)]
+
+    assert anyio.run(collect) == [500, 500, 201]
+
+def test_bulk_create_endpoints():
+    token = client.post("/token", data={"username": "admin", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    clients = [{
+        "name": f"Client Bulk {index}",
+        "email": f"bulk{index}@example.com",
+        "phone": "+33123456789",
+        "address": {"street": "1 Rue Test", "city": "Paris", "zip": "75001"}
+    } for index in range(3)]
+    before = client.get("/analytics?period=all", headers=headers).json()["client_count"]
+
+    # Un élément invalide : erreur par index, rien n'est inséré
+    invalid = clients + [dict(clients[0], phone="abc")]
+    response = client.post("/clients/bulk", json=invalid, headers=headers)
+    assert response.status_code == 422
+    assert [error["index"] for error in response.json()["detail"]] == [3]
+    assert client.get("/analytics?period=all", headers=headers).json()["client_count"] == before
+
+    response = client.post("/clients/bulk", json=clients, headers=headers)
+    assert response.status_code == 200
+    client_ids = response.json()["ids"]
+    assert response.json()["created"] == 3
+    assert client.get(f"/clients/{client_ids[0]}", headers=headers).json()["name"] == "Client Bulk 0"
+
+    response = client.post("/products/bulk", json=[{
+        "name": "Moka Bulk",
+        "description": "Café moka en lot",
+        "price": 3.0,
+        "category": "coffee",
+        "stock_quantity": 5
+    }], headers=headers)
+    product_id = response.json()["ids"][0]
+
+    def order(quantity):
+        return {
+            "client_id": client_ids[0],
+            "client_name": "Client Bulk 0",
+            "items": [{"product_id": product_id, "product_name": "Moka Bulk", "quantity": quantity, "unit_price": 3.0, "total_price": 3.0 * quantity}],
+            "total_amount": 3.0 * quantity
+        }
+
+    # Le stock (5) est vérifié pour tout le lot : 3 + 3 échoue sans rien décrémenter
+    response = client.post("/orders/bulk", json=[order(3), order(3)], headers=headers)
+    assert response.status_code == 422
+    assert [error["index"] for error in response.json()["detail"]] == [0, 1]
+    response = client.post("/orders/bulk", json=[order(3), order(2)], headers=headers)
+    assert response.status_code == 200 and response.json()["created"] == 2
+    products = client.get("/products?available_only=false", headers=headers).json()
+    assert next(p for p in products if p["id"] == product_id)["stock_quantity"] == 0
+
+    # Un lot vide est refusé
+    response = client.post("/orders/bulk", json=[], headers=headers)
+    assert response.status_code == 422
+
+def test_order_journal_replay_skips_empty_batch(tmp_path, monkeypatch):
+    import json
+    import main
+    from repositories import OrderRepository
+
+    order = {"id": "replayed-order", "client_id": "c1", "client_name": "Client",
+             "items": [{"product_id": "1", "product_name": "Espresso", "quantity": 1, "unit_price": 2.5, "total_price": 2.5}],
+             "total_amount": 2.5}
+    path = tmp_path / "orders.jsonl"
+    path.write_text(json.dumps({"orders": [], "stock": {}}) + "\n" + json.dumps({"order": order, "stock": {}}) + "\n")
+    monkeypatch.setattr(main, "orders_db", OrderRepository())
+    main.replay_order_journal(str(path))
+    assert main.orders_db.get("replayed-order").total_amount == 2.5
+
+def test_metrics_labelled_by_route_template():
+    from main import REQUEST_COUNT, REQUEST_FAILURE
+
+    token = client.post("/token", data={"username": "admin", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    before = REQUEST_COUNT.labels("GET", "/clients/{client_id}", "4xx")._value.get()
+    for index in range(5):
+        client.get(f"/clients/missing-{index}", headers=headers)
+    client.get("/does-not-exist")
+
+    # Cinq ids différents, une seule série
+    assert REQUEST_COUNT.labels("GET", "/clients/{client_id}", "4xx")._value.get() == before + 5
+    assert REQUEST_FAILURE.labels("GET", "<unmatched>")._value.get() >= 1
+    series = {sample.labels.get("endpoint") for metric in REQUEST_COUNT.collect() for sample in metric.samples}
+    assert not any(endpoint.startswith("/clients/missing") for endpoint in series)
+
+    # Routes Starlette sans scope["route"] : étiquetées par leur chemin, pas comme des 404
+    before = REQUEST_COUNT.labels("GET", "/openapi.json", "2xx")._value.get()
+    client.get("/openapi.json")
+    assert REQUEST_COUNT.labels("GET", "/openapi.json", "2xx")._value.get() == before + 1
+
+def test_metrics_exposition_format_and_cache():
+    from main import REQUEST_COUNT, exposition
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert response.text.startswith("# HELP")
+    # Les scrapes ne sont pas mesurés et réutilisent la sortie précédente
+    assert 'endpoint="/metrics"' not in response.text
+    assert exposition.render() is exposition.render()
+    assert client.get("/metrics").text == response.text
+
+    client.get("/does-not-exist")
+    assert client.get("/metrics").text != response.text
+
+    # Sans requête, la sortie expire quand même (process_*, python_gc_* évoluent seuls)
+    import time
+    from metrics import ExpositionCache
+    cache = ExpositionCache(exposition.registry, max_age=0.05)
+    first = cache.render()
+    assert cache.render() is first
+    time.sleep(0.06)
+    assert cache.render() is not first
+
+def test_latency_buckets_and_quantile_sketch():
+    import random
+    from metrics import sla_buckets
+    from quantiles import QuantileSketch
+
+    buckets = sla_buckets([], "")
+    assert 0.2 in buckets and 0.5 in buckets
+    assert {0.8, 2.0, 5.0} <= set(sla_buckets(["charge_estimation/load_scenarios.json"]))
+    assert sla_buckets([], "0.5,0.1") == (0.1, 0.5)
+
+    # Erreur relative bornée (1 %) sur p50/p95/p99
+    rng = random.Random(42)
+    values = sorted(rng.lognormvariate(-3, 1) for _ in range(20000))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * exact
+
+    client.delete("/metrics/latency")
+    client.get("/does-not-exist")
+    summary = client.get("/metrics/latency").json()
+    assert summary["GET <unmatched>"]["count"] == 1
+    assert set(summary["GET <unmatched>"]) >= {"p50_ms", "p95_ms", "p99_ms"}
+    assert not any("/metrics" in key for key in summary)
+
+def test_columnar_order_items_match_object_walk():
+    from datetime import datetime, timedelta
+    from analytics import AnalyticsAggregates
+    from columnar import ColumnarOrderItems
+    from models import Order, OrderItem
+
+    names = ["Espresso", "Croissant", "Cappuccino"]
+    orders = [
+        Order(
+            id=str(index),
+            client_id="c1",
+            client_name="Client",
+            items=[OrderItem(product_id=str(index % 3), product_name=names[index % 3], quantity=index % 4 + 1, unit_price=2.0, total_price=2.0 * (index % 4 + 1))],
+            total_amount=2.0 * (index % 4 + 1),
+            created_at=datetime(2024, 5, 1) + timedelta(hours=5 * index)
+        )
+        for index in range(30)
+    ]
+    expected = AnalyticsAggregates.from_orders(orders)
+    start, end = datetime(2024, 5, 2), datetime(2024, 5, 4)
+    in_range = [o for o in orders if start <= o.created_at < end]
+
+    for use_numpy in (True, False):
+        columns = ColumnarOrderItems(use_numpy=use_numpy)
+        for order in orders:
+            columns.record_order(order)
+        assert expected.matches(columns.summarize())
+        assert AnalyticsAggregates.from_orders(in_range).matches(columns.summarize(start, end))
+        days = columns.breakdown(start, end, "day")
+        assert [bucket["period_start"] for bucket in days] == [datetime(2024, 5, 2), datetime(2024, 5, 3)]
+        assert sum(bucket["total_orders"] for bucket in days) == len(in_range)
+
+    headers = get_admin_headers()
+    response = client.get("/analytics/breakdown", params={"period": "today", "granularity": "hour"}, headers=headers)
+    assert response.status_code == 200
+    assert all(bucket["total_orders"] > 0 for bucket in response.json())
+
+def test_order_lifecycle_endpoints():
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+
+    def stock(product_id):
+        products = client.get("/products?available_only=false", headers=headers).json()
+        return next(p for p in products if p["id"] == product_id)["stock_quantity"]
+
+    def move(order_id, status):
+        return client.post(f"/orders/{order_id}/status", json={"status": status}, headers=headers)
+
+    order = client.post("/orders", json={"client_id": client_id, "items": [{"product_id": "3", "quantity": 1}]},
+                        headers=headers).json()
+    for status in ("confirmed", "preparing", "ready", "delivered"):
+        response = move(order["id"], status)
+        assert response.status_code == 200 and response.json()["status"] == status
+    response = move(order["id"], "cancelled")
+    assert response.status_code == 409
+    assert move("missing", "confirmed").status_code == 404
+
+    # File du barista : la plus ancienne commande confirmée passe en tête
+    queued = [client.post("/orders", json={"client_id": client_id, "items": [{"product_id": "3", "quantity": 1}]},
+                          headers=headers).json()["id"] for _ in range(2)]
+    for order_id in queued:
+        move(order_id, "confirmed")
+    while (head := client.get("/orders/next", headers=headers).json())["id"] not in queued:
+        move(head["id"], "preparing")
+    assert head["id"] == queued[0]
+
+    # Annulation : stock restauré et commande retirée des analytics
+    before_stock = stock("3")
+    before = client.get("/analytics?period=all", headers=headers).json()
+    response = move(queued[0], "cancelled")
+    assert response.status_code == 200
+    assert stock("3") == before_stock + 1
+    after = client.get("/analytics?period=all", headers=headers).json()
+    assert after["total_orders"] == before["total_orders"] - 1
+    assert client.get("/analytics/consistency", headers=headers).json()["consistent"]
+    assert client.get("/orders/next", headers=headers).json()["id"] == queued[1]
+
+def test_cancelled_orders_reversed_in_every_analytics_path(tmp_path):
+    from datetime import datetime
+    from analytics import AnalyticsAggregates, TimeBucketedAnalytics
+    from columnar import ColumnarOrderItems
+    from lifecycle import InvalidTransition
+    from storage import create_repositories
+    from models import Order, OrderItem, OrderStatus, Product, ProductCategory
+
+    _, products, sqlite_orders = create_repositories("sqlite", str(tmp_path / "kawa.db"))
+    _, memory_products, memory_orders = create_repositories("memory")
+    for catalog in (products, memory_products):
+        catalog.add(Product(id="p1", name="Espresso", description="Café espresso", price=2.5,
+                            category=ProductCategory.COFFEE, stock_quantity=10))
+    orders = [Order(
+        id=f"o{index}", client_id="c0", client_name="Client",
+        items=[OrderItem(product_id="p1", product_name="Espresso", quantity=index + 1,
+                         unit_price=2.5, total_price=2.5 * (index + 1))],
+        total_amount=2.5 * (index + 1), created_at=datetime(2024, 5, 1, 9 + index)
+    ) for index in range(3)]
+    aggregates, buckets = AnalyticsAggregates.from_orders(orders), TimeBucketedAnalytics.from_orders(orders)
+    columns = ColumnarOrderItems.from_orders(orders)
+    for repository in (sqlite_orders, memory_orders):
+        repository.add_many(orders)
+        assert repository.next_with_status(OrderStatus.PENDING).id == "o0"
+        repository.transition("o0", OrderStatus.CONFIRMED)
+        cancelled = repository.transition("o1", OrderStatus.CANCELLED, datetime(2024, 5, 2))
+        assert cancelled.status == OrderStatus.CANCELLED
+        assert repository.next_with_status(OrderStatus.PENDING).id == "o2"
+        assert repository.next_with_status(OrderStatus.CONFIRMED).id == "o0"
+        with pytest.raises(InvalidTransition):
+            repository.transition("o1", OrderStatus.CONFIRMED)
+        assert repository.transition("missing", OrderStatus.CONFIRMED) is None
+
+    # L'annulation de o1 (2 articles) a remis le stock avec le changement de statut
+    assert products.get("p1").stock_quantity == 12
+    assert memory_products.get("p1").stock_quantity == 12
+
+    aggregates.remove_order(cancelled)
+    buckets.remove_order(cancelled)
+    columns.remove_order(cancelled)
+    rebuilt = AnalyticsAggregates.from_orders(memory_orders.all())
+    assert rebuilt.total_orders == 2 and rebuilt.product_quantities == {"Espresso": 4}
+    assert aggregates.matches(rebuilt)
+    for summary in (buckets.summarize(None, None), columns.summarize(), sqlite_orders.summarize()):
+        assert summary.total_orders == 2 and summary.product_quantities == {"Espresso": 4}
+        assert round(summary.total_revenue, 2) == 10.0
+    assert columns.breakdown(None, None, "hour") == sqlite_orders.breakdown(None, None, "hour")
+    assert [bucket["total_orders"] for bucket in columns.breakdown(None, None, "hour")] == [1, 1]
+
+class FailingJournal:
+    """Journal dont le fsync échoue (disque plein, volume retiré...)"""
+
+    async def append(self, record):
+        raise OSError("fsync failed")
+
+def test_journal_failure_releases_reserved_stock(monkeypatch):
+    import main
+
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+
+    def stock(product_id):
+        products = client.get("/products?available_only=false", headers=headers).json()
+        return next(p for p in products if p["id"] == product_id)["stock_quantity"]
+
+    before = stock("4")
+    monkeypatch.setattr(main, "order_journal", FailingJournal())
+    def order(quantity):
+        return {"client_id": client_id, "client_name": "Test Client",
+                "items": [{"product_id": "4", "product_name": "Thé Earl Grey", "quantity": quantity,
+                           "unit_price": 2.2, "total_price": 2.2 * quantity}],
+                "total_amount": 2.2 * quantity}
+
+    with pytest.raises(OSError):
+        client.post("/orders", json=order(2), headers=headers)
+    assert stock("4") == before
+    with pytest.raises(OSError):
+        client.post("/orders/bulk", json=[order(1), order(1)], headers=headers)
+    assert stock("4") == before
+
+def test_transition_not_applied_when_journal_fails(monkeypatch):
+    import main
+
+    headers = get_admin_headers()
+    client_id = create_test_client(headers)["id"]
+    order = client.post("/orders", json={"client_id": client_id, "items": [{"product_id": "4", "quantity": 1}]},
+                        headers=headers).json()
+    products = client.get("/products?available_only=false", headers=headers).json()
+    before = next(p for p in products if p["id"] == "4")["stock_quantity"]
+
+    monkeypatch.setattr(main, "order_journal", FailingJournal())
+    with pytest.raises(OSError):
+        client.post(f"/orders/{order['id']}/status", json={"status": "cancelled"}, headers=headers)
+    # Journalisée d'abord : rien n'a été appliqué, la commande peut encore avancer
+    assert main.orders_db.get(order["id"]).status == "pending"
+    products = client.get("/products?available_only=false", headers=headers).json()
+    assert next(p for p in products if p["id"] == "4")["stock_quantity"] == before
+    monkeypatch.setattr(main, "order_journal", None)
+    response = client.post(f"/orders/{order['id']}/status", json={"status": "confirmed"}, headers=headers)
+    assert response.status_code == 200
+
+def test_latency_quantiles_merged_across_workers(tmp_path):
+    from quantiles import LatencyQuantiles
+
+    workers = [LatencyQuantiles(shared_dir=str(tmp_path), sync_interval=0, worker_id=str(index)) for index in range(2)]
+    for index, worker in enumerate(workers):
+        for _ in range(10):
+            worker.sketch("GET", "/products").add(0.010 * (index + 1))
+            worker.sync()
+    # Chaque worker voit les requêtes des deux processus
+    for worker in workers:
+        summary = worker.summary()["GET /products"]
+        assert summary["count"] == 20 and summary["max_ms"] == 20.0
+
+    # Remise à zéro par un worker : les données de l'autre sont ignorées puis effacées
+    workers[0].reset()
+    assert workers[0].summary() == {}
+    workers[1].sync()
+    assert workers[1].sketch("GET", "/products").count == 0
+    workers[1].sketch("GET", "/products").add(0.005)
+    workers[1].sync()
+    assert workers[0].summary()["GET /products"]["count"] == 1
+
+def test_sorted_positions_match_sorted_list(monkeypatch):
+    import random
+    from repositories import SortedPositions
+
+    monkeypatch.setattr(SortedPositions, "BLOCK", 4)
+    rng = random.Random(7)
+    positions, expected = SortedPositions(), []
+    for step in range(3000):
+        if expected and rng.random() < 0.45:
+            # Retraits surtout en tête, comme une file de préparation
+            position = expected[0] if rng.random() < 0.5 else rng.choice(expected)
+            positions.remove(position)
+            expected.remove(position)
+        else:
+            position = rng.randrange(100000)
+            if position not in expected:
+                positions.add(position)
+                expected.append(position)
+                expected.sort()
+        assert len(positions) == len(expected)
+        assert positions.first() == (expected[0] if expected else None)
+    start = expected[len(expected) // 2]
+    assert list(positions.irange(start)) == [p for p in expected if p >= start]
+    assert list(positions.irange(0)) == expected
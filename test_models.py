@@ -0,0 +1,75 @@
+"""
+Banc de mesure de la validation des modèles (modèles validés par seconde)
+Chaque mesure est affichée (pytest -s) et comparée à un plancher : une
+régression d'un ordre de grandeur sur le coût de validation fait échouer le test.
+VALIDATION_BENCH_SCALE (défaut 1.0) ajuste les planchers sur une machine lente
+"""
+import os
+import time
+
+import pytest
+
+from models import Client, Order, OrderCreate, Product, PHONE_PATTERN, ZIP_PATTERN
+
+BENCH_SECONDS = 0.3
+SCALE = float(os.getenv("VALIDATION_BENCH_SCALE", "1.0"))
+
+ADDRESS = {"street": "12 Rue du Café", "city": "Paris", "zip": "75001"}
+CLIENT = {"name": "Jean Dupont", "email": "jean.dupont@example.com",
+          "phone": "+33123456789", "address": ADDRESS}
+PRODUCT = {"name": "Espresso", "description": "Café espresso traditionnel",
+           "price": 2.5, "category": "coffee", "stock_quantity": 100}
+ITEM = {"product_id": "p-1", "product_name": "Espresso", "quantity": 2,
+        "unit_price": 2.5, "total_price": 5.0}
+
+
+def order_payload(items: int) -> dict:
+    return {"client_id": "c-1", "client_name": "Jean Dupont",
+            "items": [dict(ITEM, product_id=f"p-{i}") for i in range(items)],
+            "total_amount": 5.0 * items}
+
+
+def models_per_second(model, payloads) -> float:
+    """Débit de model_validate sur les payloads (parcourus en boucle) pendant BENCH_SECONDS"""
+    validate = model.model_validate
+    count = 0
+    start = time.perf_counter()
+    deadline = start + BENCH_SECONDS
+    while time.perf_counter() < deadline:
+        for payload in payloads:
+            validate(payload)
+        count += len(payloads)
+    return count / (time.perf_counter() - start)
+
+
+# (nom, modèle, payloads, plancher en modèles/s) ; planchers ~10x sous les mesures de référence
+BENCHMARKS = [
+    ("client", Client, [CLIENT], 10_000),
+    ("client_distinct_emails", Client,
+     [dict(CLIENT, email=f"client{i}@example.com") for i in range(20_000)], 500),
+    ("product", Product, [PRODUCT], 20_000),
+    ("order_1_item", Order, [order_payload(1)], 15_000),
+    ("order_20_items", Order, [order_payload(20)], 3_000),
+    # Payload réduit de POST /orders (prix fixés par le serveur)
+    ("order_create_20_items", OrderCreate,
+     [{"client_id": "c-1", "items": [{"product_id": f"p-{i}", "quantity": 2} for i in range(20)]}], 4_000),
+]
+
+
+@pytest.mark.parametrize("name,model,payloads,floor", BENCHMARKS, ids=[b[0] for b in BENCHMARKS])
+def test_validation_throughput(name, model, payloads, floor):
+    rate = models_per_second(model, payloads)
+    print(f"\n{name}: {rate:,.0f} modèles/s (plancher {floor * SCALE:,.0f})")
+    assert rate >= floor * SCALE
+
+
+def test_precompiled_patterns_keep_validation_rules():
+    assert PHONE_PATTERN.match("+33123456789") and PHONE_PATTERN.match("33612345678")
+    assert not PHONE_PATTERN.match("+33023456789")
+    assert ZIP_PATTERN.match("75001") and not ZIP_PATTERN.match("7500A")
+
+    # Le cache d'emails ne doit ni masquer une erreur ni changer la normalisation
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            Client.model_validate(dict(CLIENT, email="pas-un-email"))
+    assert Client.model_validate(dict(CLIENT, email="Jean@Example.COM")).email == "Jean@example.com"